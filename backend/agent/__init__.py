@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The agent modules import the backend's top-level modules (utils, cache,
+# metrics, ...) directly. Put the backend directory on the path once, for
+# callers that import the agent package from outside it.
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _BACKEND_DIR not in sys.path:
+    sys.path.append(_BACKEND_DIR)
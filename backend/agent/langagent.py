@@ -1,14 +1,46 @@
-from typing import Dict, Any, List, Annotated, TypedDict, Optional, Literal
-from langgraph.graph import StateGraph, END
+from typing import Dict, Any, List, Annotated, TypedDict, Optional, Literal, AsyncIterator
 import asyncio
-from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
 
 # Import tools
 from .tools.topic_breakdown import TopicBreakdownTool
 from .tools.query_expansion import QueryExpansionTool
 from .tools.search import SearchTool
-from .tools.critique import CritiqueTool
+from .tools.critique import CritiqueTool, FALLBACK_CRITIQUE
 from .tools.summarizer import SummarizerTool
+from .tools.dedup import DedupTool
+from utils import (
+    LLMUsage,
+    call_slots,
+    is_failed_response,
+    llm_usage,
+    merge_search_results,
+    result_key,
+    token_sink
+)
+from topic_cache import TopicCache
+import budget
+import metrics
+
+# Default location of the SQLite checkpoint store
+DEFAULT_CHECKPOINT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "checkpoints.sqlite3"
+)
+
+class ResearchRunError(RuntimeError):
+    """
+    Raised when a research run fails; the run can be resumed by its run_id
+    """
+
+    def __init__(self, run_id: str, error: Exception):
+        super().__init__(f"Research run {run_id} failed: {error}")
+        self.run_id = run_id
 
 # Define agent state
 class AgentState(TypedDict, total=False):
@@ -18,11 +50,15 @@ class AgentState(TypedDict, total=False):
     # Input parameters
     topic: str
     max_results: int
+    run_id: str
     
     # Intermediate results
     subtopics: List[str]
     expanded_queries: List[str]
     search_results: List[Dict[str, Any]]
+    searched_queries: List[str]
+    new_results: List[Dict[str, Any]]
+    iterations: int
     
     # Output results
     summary: str
@@ -31,15 +67,60 @@ class AgentState(TypedDict, total=False):
     # Control flow
     needs_refinement: bool
     refinement_queries: Optional[List[str]]
+    # Limits on iterations, wall-clock time and LLM usage (see budget.py)
+    budget: Dict[str, Any]
 
 class ResearchAgentGraph:
-    def __init__(self):
+    def __init__(
+        self,
+        concurrent_expansion: bool = True,
+        expansion_concurrency: int = 4,
+        search_concurrency: int = 8,
+        batch_expansion: bool = True,
+        pipelined: Optional[bool] = None,
+        topic_cache: Optional[TopicCache] = None,
+        topic_cache_threshold: Optional[float] = None,
+        topic_seed_threshold: Optional[float] = None
+    ):
+        # Query expansion settings: expand all subtopics in batched prompts, or
+        # one call per subtopic (concurrently or serially); at most
+        # `expansion_concurrency` LLM calls are in flight at once
+        self.batch_expansion = batch_expansion
+        self.concurrent_expansion = concurrent_expansion
+        self.expansion_concurrency = max(1, expansion_concurrency)
+        # Maximum number of search requests in flight at once
+        self.search_concurrency = max(1, search_concurrency)
+        # Pipelined mode replaces the query_expansion -> search barrier with a
+        # single node in which each subtopic is searched as soon as its own
+        # expansion completes
+        if pipelined is None:
+            pipelined = os.getenv("PIPELINED_SEARCH", "0").lower() in ("1", "true", "yes")
+        self.pipelined = pipelined
+        
+        # Results of past runs, matched on topic similarity. A match at or
+        # above topic_cache_threshold is returned as is; a weaker match at or
+        # above topic_seed_threshold seeds the run with its subtopics, queries
+        # and search results so that only summarization and critique run
+        if topic_cache is None and os.getenv("TOPIC_CACHE_ENABLED", "1").lower() not in ("0", "false", "no"):
+            topic_cache = TopicCache(
+                ttl=float(os.getenv("TOPIC_CACHE_TTL", "3600")) or None,
+                max_entries=int(os.getenv("TOPIC_CACHE_SIZE", "256"))
+            )
+        self.topic_cache = topic_cache
+        if topic_cache_threshold is None:
+            topic_cache_threshold = float(os.getenv("TOPIC_CACHE_THRESHOLD", "0.85"))
+        self.topic_cache_threshold = topic_cache_threshold
+        if topic_seed_threshold is None:
+            topic_seed_threshold = float(os.getenv("TOPIC_SEED_THRESHOLD", "0.75"))
+        self.topic_seed_threshold = topic_seed_threshold
+        
         # Initialize tool instances
         self.topic_breakdown_tool = TopicBreakdownTool()
         self.query_expansion_tool = QueryExpansionTool()
         self.search_tool = SearchTool()
         self.critique_tool = CritiqueTool()
         self.summarizer_tool = SummarizerTool()
+        self.dedup_tool = DedupTool()
         
         # Build tool map using string names
         self.tools_map = {
@@ -47,30 +128,144 @@ class ResearchAgentGraph:
             "query_expansion_tool": self.query_expansion_tool,
             "search_tool": self.search_tool,
             "critique_tool": self.critique_tool,
-            "summarizer_tool": self.summarizer_tool
+            "summarizer_tool": self.summarizer_tool,
+            "dedup_tool": self.dedup_tool
         }
         
-        # Build and compile the state graph
-        self.graph = self._build_graph()
+        # Durable checkpointer, set by open_checkpointer(); when present the
+        # graph state is saved after every node so failed runs can be resumed.
+        # Checkpoints of runs not updated for checkpoint_ttl seconds (0 keeps
+        # them) are pruned at most once per checkpoint_prune_interval
+        self.checkpointer = None
+        self.checkpoint_ttl = float(os.getenv("CHECKPOINT_TTL", "86400"))
+        self.checkpoint_prune_interval = float(os.getenv("CHECKPOINT_PRUNE_INTERVAL", "3600"))
+        self._last_prune = 0.0
+        
+        # The state graph is built and compiled on first use (or by warm_up)
+        self._graph = None
+        self._graph_lock = threading.Lock()
+
+    @property
+    def graph(self):
+        """The compiled state graph, built on first access"""
+        if self._graph is None:
+            with self._graph_lock:
+                if self._graph is None:
+                    self._graph = self._build_graph()
+        return self._graph
+
+    def warm_up(self) -> None:
+        """
+        Build the graph ahead of the first request
+        """
+        self.graph
+
+    async def open_checkpointer(self, path: Optional[str] = None) -> bool:
+        """
+        Checkpoint graph state to a local SQLite database after every node
+        
+        Args:
+            path: Database file; defaults to CHECKPOINT_PATH, and an empty path
+                disables checkpointing
+        
+        Returns:
+            Whether checkpointing is enabled
+        """
+        if path is None:
+            path = os.getenv("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+        if not path:
+            return False
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError:
+            print("WARNING: langgraph-checkpoint-sqlite is not installed. Runs will not be checkpointed.")
+            return False
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = await aiosqlite.connect(path)
+        checkpointer = AsyncSqliteSaver(conn)
+        await checkpointer.setup()
+        with self._graph_lock:
+            self.checkpointer = checkpointer
+            # Recompile with the checkpointer attached
+            self._graph = None
+        await self.prune_checkpoints()
+        return True
+
+    async def close_checkpointer(self) -> None:
+        """Close the checkpoint database"""
+        checkpointer = self.checkpointer
+        if checkpointer is None:
+            return
+        with self._graph_lock:
+            self.checkpointer = None
+            self._graph = None
+        await checkpointer.conn.close()
+
+    async def prune_checkpoints(self, max_age: Optional[float] = None) -> int:
+        """
+        Delete the checkpoints of runs not updated for max_age seconds
+        
+        Completed runs drop their own checkpoints; this removes failed runs
+        that were never resumed.
+        
+        Args:
+            max_age: Age in seconds; defaults to checkpoint_ttl (0 keeps everything)
+        
+        Returns:
+            The number of runs pruned
+        """
+        checkpointer = self.checkpointer
+        if max_age is None:
+            max_age = self.checkpoint_ttl
+        if checkpointer is None or max_age <= 0:
+            return 0
+        self._last_prune = time.time()
+        cutoff = self._last_prune - max_age
+        last_updated: Dict[str, float] = {}
+        async for checkpoint in checkpointer.alist(None):
+            thread_id = checkpoint.config["configurable"]["thread_id"]
+            updated = datetime.fromisoformat(checkpoint.checkpoint["ts"]).timestamp()
+            last_updated[thread_id] = max(updated, last_updated.get(thread_id, 0.0))
+        stale = [thread_id for thread_id, updated in last_updated.items() if updated < cutoff]
+        for thread_id in stale:
+            await checkpointer.adelete_thread(thread_id)
+        return len(stale)
 
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self):
         """
         Build LangGraph workflow
         """
+        # Imported here so that importing this module stays cheap
+        from langgraph.graph import StateGraph, END
+        
         # Create state graph
         graph = StateGraph(AgentState)
         
         # Add nodes - Note: node names must not conflict with state keys
-        graph.add_node("topic_breakdown", self._run_topic_breakdown)
-        graph.add_node("query_expansion", self._run_query_expansion)
-        graph.add_node("search", self._run_search)
-        graph.add_node("summarize", self._run_summarize)
-        graph.add_node("critique_node", self._run_critique)  # Renamed to avoid conflict with state key
+        graph.add_node("topic_breakdown", self._instrument("topic_breakdown", self._run_topic_breakdown))
+        if self.pipelined:
+            graph.add_node("expand_and_search", self._instrument("expand_and_search", self._run_expand_and_search))
+        else:
+            graph.add_node("query_expansion", self._instrument("query_expansion", self._run_query_expansion))
+        graph.add_node("search", self._instrument("search", self._run_search))
+        graph.add_node("dedup", self._instrument("dedup", self._run_dedup))
+        graph.add_node("summarize", self._instrument("summarize", self._run_summarize))
+        graph.add_node("critique_node", self._instrument("critique_node", self._run_critique))  # Renamed to avoid conflict with state key
         
         # Define transitions between nodes
-        graph.add_edge("topic_breakdown", "query_expansion")
-        graph.add_edge("query_expansion", "search")
-        graph.add_edge("search", "summarize")
+        if self.pipelined:
+            # Refinement passes still loop back to the plain search node
+            graph.add_edge("topic_breakdown", "expand_and_search")
+            graph.add_edge("expand_and_search", "dedup")
+        else:
+            graph.add_edge("topic_breakdown", "query_expansion")
+            graph.add_edge("query_expansion", "search")
+        graph.add_edge("search", "dedup")
+        graph.add_edge("dedup", "summarize")
         graph.add_edge("summarize", "critique_node")
         
         # Add conditional edges from critique_node to search or END
@@ -87,51 +282,260 @@ class ResearchAgentGraph:
         graph.set_entry_point("topic_breakdown")
         
         # Compile and return the state graph
-        return graph.compile()
+        return graph.compile(checkpointer=self.checkpointer)
+
+    def _instrument(self, node: str, func):
+        """
+        Wrap a node function so that its latency is recorded per node and the
+        LLM usage of its calls is charged to the run's budget
+        """
+        async def run_node(state: AgentState) -> AgentState:
+            usage = LLMUsage()
+            token = llm_usage.set(usage)
+            try:
+                with metrics.NODE_LATENCY.time(node=node):
+                    state = await func(state)
+            finally:
+                llm_usage.reset(token)
+            if state.get("budget") is not None:
+                budget.charge(state["budget"], usage.total_chars, usage.calls)
+            return state
+        return run_node
 
     async def _run_topic_breakdown(self, state: AgentState) -> AgentState:
-        """Run the topic breakdown tool"""
+        """Run the topic breakdown tool, unless the state was seeded with subtopics"""
+        if state.get("subtopics"):
+            return state
         topic = state["topic"]
         result = await self.topic_breakdown_tool(topic)
         state["subtopics"] = result
         return state
 
     async def _run_query_expansion(self, state: AgentState) -> AgentState:
-        """Run the query expansion tool"""
-        expanded_queries = []
-        for subtopic in state["subtopics"]:
-            expanded_query = await self.query_expansion_tool(subtopic)
-            expanded_queries.append(expanded_query)
+        """Run the query expansion tool, unless the state was seeded with queries"""
+        if state.get("expanded_queries"):
+            return state
+        if budget.is_nearly_spent(state.get("budget")):
+            # Search the subtopics as they are rather than spend the reserve
+            state["expanded_queries"] = list(state["subtopics"])
+            return state
+        if self.batch_expansion:
+            expanded_queries = await self.query_expansion_tool.expand_batch(
+                state["subtopics"],
+                max_concurrency=self.expansion_concurrency
+            )
+        elif self.concurrent_expansion:
+            expanded_queries = await self._expand_concurrently(state["subtopics"])
+        else:
+            expanded_queries = [
+                await self._expand_one(subtopic) for subtopic in state["subtopics"]
+            ]
         state["expanded_queries"] = expanded_queries
         return state
 
+    async def _expand_concurrently(self, subtopics: List[str]) -> List[str]:
+        """Expand all subtopics concurrently, bounded by expansion_concurrency"""
+        semaphore = asyncio.Semaphore(self.expansion_concurrency)
+
+        async def expand(subtopic: str) -> str:
+            async with semaphore:
+                return await self._expand_one(subtopic)
+
+        # gather preserves input order, so queries stay aligned with subtopics
+        return await asyncio.gather(*(expand(subtopic) for subtopic in subtopics))
+
+    async def _expand_one(self, subtopic: str) -> str:
+        """Expand a single subtopic, falling back to the subtopic itself on failure"""
+        try:
+            expanded_query = await self.query_expansion_tool(subtopic)
+        except Exception as e:
+            print(f"Error expanding query '{subtopic}': {e}")
+            return subtopic
+        # The LLM helpers report failures as an error string rather than raising
+        if is_failed_response(expanded_query):
+            return subtopic
+        return expanded_query
+
     async def _run_search(self, state: AgentState) -> AgentState:
-        """Run the search tool for each expanded query"""
-        all_results = []
-        for query in state["expanded_queries"]:
-            search_results = await self.search_tool(
-                query=query,
-                max_results=state["max_results"]
-            )
-            all_results.extend(search_results)
-        state["search_results"] = all_results
+        """
+        Run the search tool for all queries not searched yet, concurrently
+        
+        The first pass searches the expanded queries; refinement passes search
+        only the refinement queries that have not been seen before. New results
+        are merged into the existing pool and also recorded in "new_results".
+        """
+        if state.get("needs_refinement") and state.get("refinement_queries"):
+            candidates = state["refinement_queries"]
+        else:
+            candidates = state["expanded_queries"]
+        
+        searched = list(state.get("searched_queries") or [])
+        seen = set(searched)
+        queries = []
+        for query in candidates:
+            normalized = self.search_tool.normalize_query(query)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                searched.append(normalized)
+                queries.append(query)
+        
+        merged = {result_key(result): result for result in state.get("search_results") or []}
+        added = await self._search_queries(queries, state["max_results"], merged)
+        state["search_results"] = list(merged.values())
+        state["new_results"] = added
+        state["searched_queries"] = searched
+        state["iterations"] = state.get("iterations", 0) + 1
+        return state
+
+    async def _run_expand_and_search(self, state: AgentState) -> AgentState:
+        """
+        Expand each subtopic and search it as soon as its expansion completes
+        
+        Expansions (one call per subtopic, at most expansion_concurrency at a
+        time) feed an asyncio queue drained by search_concurrency search
+        workers, so a slow expansion only delays its own search. The node
+        finishes once every subtopic has been expanded and searched.
+        """
+        if state.get("expanded_queries"):
+            # Seeded from the topic cache
+            return await self._run_search(state)
+        
+        subtopics = state["subtopics"]
+        expanded: List[str] = list(subtopics)
+        queue: asyncio.Queue = asyncio.Queue()
+        expand_slots = asyncio.Semaphore(self.expansion_concurrency)
+        workers = min(self.search_concurrency, max(1, len(subtopics)))
+        
+        searched = list(state.get("searched_queries") or [])
+        seen = set(searched)
+        merged = {result_key(result): result for result in state.get("search_results") or []}
+        added: List[Dict[str, Any]] = []
+
+        async def expand(index: int, subtopic: str):
+            async with expand_slots:
+                if not budget.is_nearly_spent(state.get("budget")):
+                    expanded[index] = await self._expand_one(subtopic)
+            await queue.put(expanded[index])
+
+        async def produce():
+            try:
+                await asyncio.gather(*(expand(i, subtopic) for i, subtopic in enumerate(subtopics)))
+            finally:
+                # One stop marker per search worker
+                for _ in range(workers):
+                    await queue.put(None)
+
+        async def consume():
+            while True:
+                query = await queue.get()
+                if query is None:
+                    return
+                normalized = self.search_tool.normalize_query(query)
+                if not normalized or normalized in seen:
+                    continue
+                seen.add(normalized)
+                searched.append(normalized)
+                try:
+                    results = await self.search_tool(query=query, max_results=state["max_results"])
+                except Exception as e:
+                    print(f"Error searching '{query}': {e}")
+                    results = []
+                added.extend(merge_search_results(merged, results, query))
+
+        await asyncio.gather(produce(), *(consume() for _ in range(workers)))
+        
+        state["expanded_queries"] = expanded
+        state["search_results"] = list(merged.values())
+        state["new_results"] = added
+        state["searched_queries"] = searched
+        state["iterations"] = state.get("iterations", 0) + 1
+        return state
+
+    async def _search_queries(
+        self,
+        queries: List[str],
+        max_results: int,
+        merged: Dict[str, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Search all queries concurrently and merge results into `merged` as they arrive
+        
+        Results are deduplicated by normalized URL; each merged result records
+        the queries that returned it under "queries".
+        
+        Returns:
+            The results newly added to `merged`
+        """
+        semaphore = asyncio.Semaphore(self.search_concurrency)
+
+        async def search(query: str):
+            async with semaphore:
+                try:
+                    results = await self.search_tool(query=query, max_results=max_results)
+                except Exception as e:
+                    print(f"Error searching '{query}': {e}")
+                    results = []
+                return query, results
+
+        added = []
+        for next_done in asyncio.as_completed([search(query) for query in dict.fromkeys(queries)]):
+            query, results = await next_done
+            added.extend(merge_search_results(merged, results, query))
+        return added
+
+    async def _run_dedup(self, state: AgentState) -> AgentState:
+        """Collapse near-duplicate search results before summarization"""
+        new_keys = {result_key(result) for result in state.get("new_results") or []}
+        state["search_results"] = await self.dedup_tool(state["search_results"])
+        # New results absorbed into an existing result are no longer new
+        state["new_results"] = [
+            result for result in state["search_results"] if result_key(result) in new_keys
+        ]
         return state
 
     async def _run_summarize(self, state: AgentState) -> AgentState:
-        """Run the summarizer tool"""
-        summary = await self.summarizer_tool(
-            topic=state["topic"],
-            search_results=state["search_results"]
-        )
+        """
+        Run the summarizer tool
+        
+        On refinement passes the previous summary is revised with the new
+        results only, rather than regenerated from the whole pool.
+        """
+        token_budget = budget.context_tokens(state.get("budget"), self.summarizer_tool.packer.token_budget)
+        if state.get("summary"):
+            # Keep the best summary so far once the budget is used up
+            if not state.get("new_results") or budget.is_exhausted(state.get("budget")):
+                return state
+            summary = await self.summarizer_tool.update(
+                topic=state["topic"],
+                previous_summary=state["summary"],
+                new_results=state["new_results"],
+                subtopics=state.get("subtopics"),
+                token_budget=token_budget
+            )
+            # A failed revision must not replace the earlier summary
+            if is_failed_response(summary):
+                return state
+        else:
+            summary = await self.summarizer_tool(
+                topic=state["topic"],
+                search_results=state["search_results"],
+                subtopics=state.get("subtopics"),
+                token_budget=token_budget
+            )
         state["summary"] = summary
         return state
 
     async def _run_critique(self, state: AgentState) -> AgentState:
-        """Run the critique tool"""
+        """Run the critique tool, unless the budget is nearly spent"""
+        if budget.is_nearly_spent(state.get("budget")):
+            state["needs_refinement"] = False
+            return state
         critique_result = await self.critique_tool(
             topic=state["topic"],
             summary=state["summary"],
-            search_results=state["search_results"]
+            search_results=state["search_results"],
+            subtopics=state.get("subtopics"),
+            token_budget=budget.context_tokens(state.get("budget"), self.critique_tool.packer.token_budget)
         )
         
         # Ensure the critique_result is a dictionary
@@ -157,43 +561,374 @@ class ResearchAgentGraph:
 
     def _should_refine(self, state: AgentState) -> str:
         """Determine whether to re-run search with refined queries"""
-        if state["needs_refinement"] and state.get("refinement_queries", []):
-            # Update expanded queries to refined queries
-            state["expanded_queries"] = state["refinement_queries"]
-            return "search"
-        else:
+        if not state["needs_refinement"]:
             return "end"
+        # Stop at the iteration cap, or when only the budget reserve is left
+        if not budget.can_refine(state.get("budget"), state.get("iterations", 0)):
+            return "end"
+        # Only loop back if at least one refinement query has not been searched yet
+        searched = set(state.get("searched_queries") or [])
+        for query in state.get("refinement_queries") or []:
+            normalized = self.search_tool.normalize_query(query)
+            if normalized and normalized not in searched:
+                return "search"
+        return "end"
+
+    def _initial_state(self, inputs: Dict[str, Any]) -> AgentState:
+        """Build the initial graph state from run inputs"""
+        return AgentState(
+            topic=inputs["topic"],
+            max_results=inputs.get("max_results", 5),
+            run_id=inputs.get("run_id") or uuid.uuid4().hex,
+            subtopics=[],
+            expanded_queries=[],
+            search_results=[],
+            searched_queries=[],
+            new_results=[],
+            iterations=0,
+            summary="",
+            critique="",
+            needs_refinement=False,
+            budget=budget.new_budget(
+                max_iterations=inputs.get("max_iterations"),
+                time_budget=inputs.get("time_budget"),
+                char_budget=inputs.get("char_budget")
+            )
+        )
+
+    def _check_topic_cache(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        """
+        Look the topic up in the topic cache
+        
+        Returns:
+            The cached result for a close enough match. For a weaker match the
+            state is seeded with the cached subtopics and queries (and results,
+            unless the cached run fetched fewer per query) and None is
+            returned, as it is on a miss.
+        """
+        if self.topic_cache is None:
+            return None
+        match = self.topic_cache.lookup(state["topic"], min_similarity=self.topic_seed_threshold)
+        if match is None:
+            metrics.TOPIC_CACHE_LOOKUPS.inc(outcome="miss")
+            return None
+        cached, similarity, entry = match
+        if similarity >= self.topic_cache_threshold and entry.max_results >= state["max_results"]:
+            metrics.TOPIC_CACHE_LOOKUPS.inc(outcome="hit")
+            result = cached["result"]
+            result["topic"] = state["topic"]
+            result["run_id"] = state["run_id"]
+            result["budget"] = state["budget"]
+            return result
+        metrics.TOPIC_CACHE_LOOKUPS.inc(outcome="seed")
+        state["subtopics"] = cached["result"]["subtopics"]
+        state["expanded_queries"] = cached["expanded_queries"]
+        # Results fetched with a smaller max_results are not reused, so that
+        # the queries are searched again at the requested size
+        if entry.max_results >= state["max_results"]:
+            state["search_results"] = cached["result"]["search_results"]
+            state["searched_queries"] = cached["searched_queries"]
+        return None
+
+    def _store_topic(self, state: Dict[str, Any]) -> None:
+        """Add a completed run to the topic cache, unless its summary or critique failed"""
+        if (
+            self.topic_cache is None
+            or is_failed_response(state.get("summary", ""))
+            or state.get("critique") == FALLBACK_CRITIQUE
+        ):
+            return
+        self.topic_cache.put(state["topic"], state["max_results"], {
+            "result": self._result(state),
+            "expanded_queries": state.get("expanded_queries") or [],
+            "searched_queries": state.get("searched_queries") or []
+        })
+
+    @staticmethod
+    def _result(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the public result fields from a final graph state"""
+        return {
+            "topic": state["topic"],
+            "run_id": state.get("run_id"),
+            "subtopics": state["subtopics"],
+            "search_results": state["search_results"],
+            "summary": state["summary"],
+            "critique": state["critique"],
+            "budget": state.get("budget")
+        }
 
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
         Run the research agent
         
         Args:
-            inputs: A dictionary containing "topic" and optional parameters
+            inputs: A dictionary containing "topic" and optional parameters,
+                including "run_id" to choose the id a failed run is resumed by
+                and the "max_iterations", "time_budget" (seconds) and
+                "char_budget" (LLM prompt plus response characters) limits
         
         Returns:
             A result dictionary containing the summary and supporting information
+        
+        Raises:
+            ResearchRunError: The run failed; pass its run_id to resume()
         """
         # Initialize state
-        state = AgentState(
-            topic=inputs["topic"],
-            max_results=inputs.get("max_results", 5),
-            subtopics=[],
-            expanded_queries=[],
-            search_results=[],
-            summary="",
-            critique="",
-            needs_refinement=False
-        )
+        state = self._initial_state(inputs)
+        cached = self._check_topic_cache(state)
+        if cached is not None:
+            return cached
         
         # Invoke the graph and wait for result
-        result = await self.graph.ainvoke(state)
+        result = await self._invoke(state, state["run_id"])
         
         # Return results
-        return {
-            "topic": result["topic"],
-            "subtopics": result["subtopics"],
-            "search_results": result["search_results"],
-            "summary": result["summary"],
-            "critique": result["critique"]
+        return self._result(result)
+
+    async def run_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        concurrency: int = 16,
+        topic_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Research many topics at once, yielding each result as it completes
+        
+        All LLM and search calls of the batch share `concurrency` slots, so
+        throughput is bounded by one global limit rather than per topic. The
+        LLM, search and topic caches are shared across the batch, identical
+        searches in flight are issued once, and topics repeated in the batch
+        (ignoring case and whitespace) are researched once.
+        
+        Args:
+            batch: Run inputs, each containing "topic" and optional parameters
+            concurrency: Maximum LLM and search calls in flight for the batch
+            topic_concurrency: Maximum topics in progress (defaults to concurrency)
+        
+        Yields:
+            A "result" event ({"index", "topic", "result"}) or an "error" event
+            ({"index", "topic", "detail", "run_id"}) per input, in completion
+            order, then a "done" event with the number of completed and failed topics.
+        """
+        concurrency = max(1, concurrency)
+        topic_slots = asyncio.Semaphore(max(1, topic_concurrency or concurrency))
+        groups: Dict[Any, List[int]] = {}
+        for index, inputs in enumerate(batch):
+            key = (" ".join(inputs["topic"].split()).casefold(), inputs.get("max_results", 5))
+            groups.setdefault(key, []).append(index)
+
+        async def research(indices: List[int]):
+            async with topic_slots:
+                try:
+                    return indices, await self.run(batch[indices[0]]), None
+                except Exception as e:
+                    return indices, None, e
+
+        # Tasks copy the current context when created, so every call made on
+        # behalf of the batch sees the shared slots
+        token = call_slots.set(asyncio.Semaphore(concurrency))
+        try:
+            tasks = [asyncio.ensure_future(research(indices)) for indices in groups.values()]
+        finally:
+            call_slots.reset(token)
+        
+        completed = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, result, error = await next_done
+                for index in indices:
+                    topic = batch[index]["topic"]
+                    if error is None:
+                        completed += 1
+                        yield {"event": "result", "data": {"index": index, "topic": topic, "result": result}}
+                    else:
+                        failed += 1
+                        yield {
+                            "event": "error",
+                            "data": {
+                                "index": index,
+                                "topic": topic,
+                                "detail": str(error),
+                                "run_id": getattr(error, "run_id", None)
+                            }
+                        }
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        yield {"event": "done", "data": {"completed": completed, "failed": failed}}
+
+    async def resume(self, run_id: str) -> Dict[str, Any]:
+        """
+        Continue a failed or interrupted run from its last completed node
+        
+        Args:
+            run_id: The run_id of the run to resume
+        
+        Returns:
+            The same result dictionary that run() returns
+        
+        Raises:
+            LookupError: Checkpointing is disabled or no checkpoint exists for run_id
+        """
+        if self.checkpointer is None:
+            raise LookupError("Checkpointing is not enabled")
+        snapshot = await self.graph.aget_state(self._config(run_id))
+        if not snapshot.values:
+            raise LookupError(f"No checkpoint found for run {run_id}")
+        if not snapshot.next:
+            # Finished but not cleaned up (e.g. the process stopped right after the last node)
+            await self._finish_run(run_id, snapshot.values)
+            return self._result(snapshot.values)
+        # Only the time spent before the last checkpoint counts against the budget
+        run_budget = snapshot.values.get("budget")
+        if run_budget and snapshot.created_at:
+            budget.resume(run_budget, datetime.fromisoformat(snapshot.created_at).timestamp())
+            await self.graph.aupdate_state(self._config(run_id), {"budget": run_budget})
+        # Invoking with no input continues from the saved checkpoint
+        result = await self._invoke(None, run_id)
+        return self._result(result)
+
+    async def _invoke(self, state: Optional[AgentState], run_id: str) -> Dict[str, Any]:
+        """Run the graph to completion, starting fresh or from the checkpoint of run_id"""
+        with metrics.RESEARCH_IN_FLIGHT.track_inprogress():
+            try:
+                result = await self.graph.ainvoke(state, self._config(run_id))
+            except Exception as e:
+                metrics.RESEARCH_RUNS.inc(outcome="error")
+                raise ResearchRunError(run_id, e) from e
+        await self._finish_run(run_id, result)
+        return result
+
+    @staticmethod
+    def _config(run_id: str) -> Dict[str, Any]:
+        """Graph config that keys checkpoints by run id"""
+        return {"configurable": {"thread_id": run_id}}
+
+    async def _finish_run(self, run_id: str, state: Dict[str, Any]) -> None:
+        """Record a completed run, cache it by topic and drop its checkpoints"""
+        self._record_run(state)
+        self._store_topic(state)
+        if self.checkpointer is not None:
+            try:
+                await self.checkpointer.adelete_thread(run_id)
+                if time.time() - self._last_prune >= self.checkpoint_prune_interval:
+                    await self.prune_checkpoints()
+            except Exception as e:
+                print(f"Error deleting checkpoints for run {run_id}: {e}")
+
+    @staticmethod
+    def _record_run(state: Dict[str, Any]) -> None:
+        """Record metrics for a completed run"""
+        metrics.RESEARCH_RUNS.inc(outcome="ok")
+        metrics.REFINEMENT_ITERATIONS.observe(max(0, state.get("iterations", 0) - 1))
+
+    async def stream(self, inputs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the research agent, yielding a progress event as each node finishes
+        
+        Args:
+            inputs: A dictionary containing "topic" and optional parameters
+        
+        Yields:
+            Event dictionaries of the form {"event": name, "data": payload}. Node
+            events are "subtopics", "expanded_queries", "search_results",
+            "deduplicated_results", "summary" and "critique"; the last event is
+            "result", carrying the same payload that run() returns. While a
+            summary is being generated its text arrives as "summary_token"
+            events, and "summary_reset" means the text streamed so far for
+            that summary should be discarded (the call is being retried). A
+            topic cache hit yields only the "result" event.
+        """
+        state = self._initial_state(inputs)
+        cached = self._check_topic_cache(state)
+        if cached is not None:
+            yield {"event": "result", "data": cached}
+            return
+        final_state: Dict[str, Any] = dict(state)
+        # Node events and summary tokens are produced by the graph task and
+        # relayed through one queue, in the order they happen; None ends it
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def forward_token(text: Optional[str]) -> None:
+            iteration = final_state.get("iterations", 0)
+            if text is None:
+                queue.put_nowait({"event": "summary_reset", "data": {"iteration": iteration}})
+            else:
+                queue.put_nowait({"event": "summary_token", "data": {"iteration": iteration, "text": text}})
+
+        async def run_graph():
+            try:
+                async for update in self.graph.astream(
+                    state, self._config(state["run_id"]), stream_mode="updates"
+                ):
+                    for node, node_state in update.items():
+                        final_state.update(node_state or {})
+                        for event in self._node_events(node, final_state):
+                            queue.put_nowait(event)
+            finally:
+                queue.put_nowait(None)
+        
+        # The task copies the current context, so the graph's LLM calls see the sink
+        token = token_sink.set(forward_token)
+        try:
+            task = asyncio.ensure_future(run_graph())
+        finally:
+            token_sink.reset(token)
+        
+        with metrics.RESEARCH_IN_FLIGHT.track_inprogress():
+            try:
+                while True:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    yield event
+                await task
+            except Exception as e:
+                metrics.RESEARCH_RUNS.inc(outcome="error")
+                raise ResearchRunError(state["run_id"], e) from e
+            finally:
+                task.cancel()
+        await self._finish_run(state["run_id"], final_state)
+        
+        yield {"event": "result", "data": self._result(final_state)}
+
+    @staticmethod
+    def _node_events(node: str, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Build the progress events emitted after a graph node completes"""
+        iteration = state.get("iterations", 0)
+        expanded_queries = {"event": "expanded_queries", "data": {"expanded_queries": state["expanded_queries"]}}
+        search_results = {
+            "event": "search_results",
+            "data": {
+                "iteration": iteration,
+                "search_results": state["search_results"],
+                "new_results": len(state.get("new_results") or [])
+            }
         }
+        if node == "topic_breakdown":
+            return [{"event": "subtopics", "data": {"subtopics": state["subtopics"]}}]
+        if node == "query_expansion":
+            return [expanded_queries]
+        if node == "search":
+            return [search_results]
+        if node == "expand_and_search":
+            return [expanded_queries, search_results]
+        if node == "dedup":
+            return [{
+                "event": "deduplicated_results",
+                "data": {"iteration": iteration, "search_results": state["search_results"]}
+            }]
+        if node == "summarize":
+            return [{"event": "summary", "data": {"iteration": iteration, "summary": state["summary"]}}]
+        if node == "critique_node":
+            return [{
+                "event": "critique",
+                "data": {
+                    "iteration": iteration,
+                    "critique": state["critique"],
+                    "needs_refinement": state.get("needs_refinement", False),
+                    "refinement_queries": state.get("refinement_queries") or []
+                }
+            }]
+        return []
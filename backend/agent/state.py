@@ -7,11 +7,15 @@ class AgentState(TypedDict, total=False):
     # Input parameters
     topic: str
     max_results: int
+    run_id: str
     
     # Intermediate results
     subtopics: List[str]
     expanded_queries: List[str]
     search_results: List[Dict[str, Any]]
+    searched_queries: List[str]
+    new_results: List[Dict[str, Any]]
+    iterations: int
     
     # Output results
     summary: str
@@ -19,4 +23,6 @@ class AgentState(TypedDict, total=False):
     
     # Control flow
     needs_refinement: bool
-    refinement_queries: Optional[List[str]]
\ No newline at end of file
+    refinement_queries: Optional[List[str]]
+    # Limits on iterations, wall-clock time and LLM usage (see budget.py)
+    budget: Dict[str, Any]
\ No newline at end of file
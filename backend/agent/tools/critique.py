@@ -1,20 +1,29 @@
-from typing import Dict, List, Any
-import sys
-import os
+from typing import Dict, List, Any, Optional
 import json
-# Add parent directory to path to import utils
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils import generate_gemini_response
+from utils import generate_gemini_response, is_failed_response
+from context_packer import ContextPacker
+
+# Critique used when the model's answer cannot be parsed
+FALLBACK_CRITIQUE = "The summary appears reasonable but could benefit from additional details and sources."
 
 class CritiqueTool:
     """
     Tool to critique research summaries and suggest improvements
     """
     
-    def __init__(self):
+    def __init__(self, token_budget: int = 1500):
         self.__name__ = "critique_tool"
+        # Selects the most relevant results that fit the budget, to avoid token limits
+        self.packer = ContextPacker(token_budget=token_budget, max_snippet_tokens=80)
     
-    async def __call__(self, topic: str, summary: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def __call__(
+        self,
+        topic: str,
+        summary: str,
+        search_results: List[Dict[str, Any]],
+        subtopics: Optional[List[str]] = None,
+        token_budget: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Critique a research summary and suggest improvements
         
@@ -22,14 +31,19 @@ class CritiqueTool:
             topic: The research topic
             summary: The generated summary
             search_results: The search results used to generate the summary
+            subtopics: Optional subtopics, used to rank results for the prompt
+            token_budget: Optional cap on the tokens of search results in the prompt
             
         Returns:
             Dictionary with critique and refinement suggestions
+            
+        Raises:
+            RuntimeError: The LLM call failed
         """
         # Format search results for the LLM
         formatted_results = "\n".join([
             f"- {result.get('title', 'No title')}: {result.get('snippet', 'No snippet')}"
-            for result in search_results[:3]  # Limit to avoid token limits
+            for result in self.packer.pack(search_results, topic, subtopics, token_budget)
         ])
         
         prompt = f"""
@@ -58,7 +72,11 @@ class CritiqueTool:
         - "refinement_queries": List of additional search queries (if needs_refinement is true)
         """
         
-        response = await generate_gemini_response(prompt)
+        response = await generate_gemini_response(prompt, tool_name=self.__name__)
+        # Fail the node (the run can be resumed from its checkpoint) rather
+        # than inventing a critique
+        if is_failed_response(response):
+            raise RuntimeError(f"Critique call failed: {response}")
         
         # Extract the JSON from the response
         try:
@@ -85,7 +103,7 @@ class CritiqueTool:
             print(f"Error parsing critique: {e}")
             # Return a fallback result
             return {
-                "critique": "The summary appears reasonable but could benefit from additional details and sources.",
+                "critique": FALLBACK_CRITIQUE,
                 "needs_refinement": False,
                 "refinement_queries": []
             }
\ No newline at end of file
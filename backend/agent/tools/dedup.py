@@ -0,0 +1,129 @@
+from typing import List, Dict, Any, Optional
+import hashlib
+
+from utils import tokenize
+
+class DedupTool:
+    """
+    Tool to collapse near-duplicate search results (e.g. syndicated copies)
+
+    Each result is fingerprinted with a 64-bit SimHash over the words and word
+    shingles of its title and snippet. Fingerprints are split into bands and bucketed, so
+    only results that share a band are compared; this keeps the pass linear
+    in the number of results. Results within `max_distance` bits of an earlier
+    result are merged into it.
+    """
+
+    HASH_BITS = 64
+
+    def __init__(self, shingle_size: int = 2, max_distance: int = 6, bands: int = 7):
+        self.__name__ = "dedup_tool"
+        self.shingle_size = shingle_size
+        self.max_distance = max_distance
+        # With more bands than max_distance, any two fingerprints within
+        # max_distance bits are guaranteed to share at least one band
+        self.bands = max(bands, max_distance + 1)
+        self.band_bits = self.HASH_BITS // self.bands
+
+    async def __call__(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Remove near-duplicate search results
+
+        Args:
+            search_results: The search results, in ranking order
+
+        Returns:
+            The representative results. Each keeps the URLs of the duplicates
+            it absorbed under "extra_sources" and the union of their "queries".
+        """
+        buckets: Dict[tuple, List[int]] = {}
+        fingerprints: List[int] = []
+        representatives: List[Dict[str, Any]] = []
+
+        for result in search_results:
+            fingerprint = self.simhash(f"{result.get('title', '')} {result.get('snippet', '')}")
+            keys = self._band_keys(fingerprint)
+
+            match = self._find_match(fingerprint, keys, buckets, fingerprints)
+            if match is not None:
+                self._absorb(representatives[match], result)
+                continue
+
+            index = len(representatives)
+            representative = dict(result)
+            # Copy list fields so absorbing duplicates never mutates the input
+            for field in ("queries", "extra_sources"):
+                if field in representative:
+                    representative[field] = list(representative[field])
+            representatives.append(representative)
+            fingerprints.append(fingerprint)
+            for key in keys:
+                buckets.setdefault(key, []).append(index)
+
+        return representatives
+
+    def simhash(self, text: str) -> int:
+        """
+        Compute a 64-bit SimHash over the words and word shingles (up to
+        shingle_size words) of a text
+        """
+        tokens = tokenize(text)
+        shingles = [
+            " ".join(tokens[i:i + size])
+            for size in range(1, self.shingle_size + 1)
+            for i in range(len(tokens) - size + 1)
+        ]
+
+        # Each shingle votes for the bits set in its hash
+        counts = [0] * self.HASH_BITS
+        for shingle in shingles:
+            digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "big")
+            for bit in range(self.HASH_BITS):
+                if value >> bit & 1:
+                    counts[bit] += 1
+
+        fingerprint = 0
+        for bit, count in enumerate(counts):
+            # Bit is set when more than half of the shingles have it set
+            if 2 * count > len(shingles):
+                fingerprint |= 1 << bit
+        return fingerprint
+
+    def _band_keys(self, fingerprint: int) -> List[tuple]:
+        """Split a fingerprint into (band index, band value) bucket keys"""
+        mask = (1 << self.band_bits) - 1
+        return [
+            (band, fingerprint >> (band * self.band_bits) & mask)
+            for band in range(self.bands)
+        ]
+
+    def _find_match(
+        self,
+        fingerprint: int,
+        keys: List[tuple],
+        buckets: Dict[tuple, List[int]],
+        fingerprints: List[int]
+    ) -> Optional[int]:
+        """Return the index of the first representative within max_distance, if any"""
+        candidates = sorted({index for key in keys for index in buckets.get(key, [])})
+        for index in candidates:
+            if bin(fingerprint ^ fingerprints[index]).count("1") <= self.max_distance:
+                return index
+        return None
+
+    @staticmethod
+    def _absorb(representative: Dict[str, Any], duplicate: Dict[str, Any]) -> None:
+        """Record a duplicate's URL and queries on its representative"""
+        url = duplicate.get("url")
+        extra_sources = representative.setdefault("extra_sources", [])
+        if url and url != representative.get("url") and url not in extra_sources:
+            extra_sources.append(url)
+        for extra in duplicate.get("extra_sources", []):
+            if extra not in extra_sources:
+                extra_sources.append(extra)
+        if "queries" in representative or "queries" in duplicate:
+            queries = representative.setdefault("queries", [])
+            for query in duplicate.get("queries", []):
+                if query not in queries:
+                    queries.append(query)
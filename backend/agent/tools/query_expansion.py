@@ -1,18 +1,18 @@
-from typing import List
-import sys
-import os
+from typing import List, Optional
+import json
+import asyncio
 
-# Add parent directory to path to import utils
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils import generate_gemini_response
+from utils import generate_gemini_response, is_failed_response
 
 class QueryExpansionTool:
     """
     Tool to expand search queries with related terms and variations
     """
     
-    def __init__(self):
+    def __init__(self, batch_size: int = 10):
         self.__name__ = "query_expansion_tool"
+        # Maximum number of queries expanded by a single batch prompt
+        self.batch_size = max(1, batch_size)
     
     async def __call__(self, query: str) -> str:
         """
@@ -37,7 +37,7 @@ class QueryExpansionTool:
         Return ONLY the expanded search query as a single string, optimized for search engines.
         """
         
-        response = await generate_gemini_response(prompt)
+        response = await generate_gemini_response(prompt, tool_name=self.__name__)
         
         # Clean up the response
         expanded_query = response.strip()
@@ -46,4 +46,108 @@ class QueryExpansionTool:
         if expanded_query.startswith('"') and expanded_query.endswith('"'):
             expanded_query = expanded_query[1:-1]
             
-        return expanded_query
\ No newline at end of file
+        return expanded_query
+    
+    async def expand_batch(self, queries: List[str], max_concurrency: int = 4) -> List[str]:
+        """
+        Expand several search queries with as few LLM calls as possible
+        
+        Queries are sent in batches of `batch_size` per structured-JSON prompt.
+        Entries missing or invalid in the batch response are expanded with
+        individual calls; if that fails too, the original query is kept.
+        
+        Args:
+            queries: The original search queries
+            max_concurrency: Maximum number of LLM calls in flight at once
+            
+        Returns:
+            The expanded queries, in the same order as the input
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def expand_chunk(chunk: List[str]) -> List[Optional[str]]:
+            async with semaphore:
+                return await self._expand_chunk(chunk)
+        
+        async def expand_single(query: str) -> str:
+            async with semaphore:
+                try:
+                    expanded_query = await self(query)
+                except Exception as e:
+                    print(f"Error expanding query '{query}': {e}")
+                    return query
+                # Failed calls come back as an error string, not an exception
+                if is_failed_response(expanded_query):
+                    return query
+                return expanded_query
+        
+        chunks = [
+            queries[start:start + self.batch_size]
+            for start in range(0, len(queries), self.batch_size)
+        ]
+        chunk_results = await asyncio.gather(*(expand_chunk(chunk) for chunk in chunks))
+        expanded = [item for chunk in chunk_results for item in chunk]
+        
+        # Fall back to per-item calls only for the entries that failed
+        failed = [i for i, item in enumerate(expanded) if item is None]
+        if failed:
+            retried = await asyncio.gather(*(expand_single(queries[i]) for i in failed))
+            for i, expanded_query in zip(failed, retried):
+                expanded[i] = expanded_query
+        return expanded
+    
+    async def _expand_chunk(self, queries: List[str]) -> List[Optional[str]]:
+        """
+        Expand a batch of queries in one call; entries that fail validation are None
+        """
+        numbered_queries = "\n".join(f"{i}. {query}" for i, query in enumerate(queries, 1))
+        prompt = f"""
+        You are a search expert tasked with expanding search queries to improve 
+        search results. For each query below, enhance it by:
+        
+        1. Adding synonyms or related terms
+        2. Including alternative phrasings
+        3. Formulating the query to maximize search relevance
+        
+        ORIGINAL QUERIES:
+        {numbered_queries}
+        
+        FORMAT YOUR RESPONSE AS A JSON ARRAY with one object per query, in the same order.
+        Each object must have the keys "index" (the query number) and "expanded_query" 
+        (the expanded search query as a single string, optimized for search engines).
+        Example: [{{"index": 1, "expanded_query": "..."}}, {{"index": 2, "expanded_query": "..."}}]
+        """
+        
+        try:
+            response = await generate_gemini_response(prompt, tool_name=self.__name__)
+            items = self._parse_batch_response(response)
+        except Exception as e:
+            print(f"Error parsing batch query expansion: {e}")
+            return [None] * len(queries)
+        
+        expanded: List[Optional[str]] = [None] * len(queries)
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            expanded_query = item.get("expanded_query")
+            if (
+                isinstance(index, int) and 1 <= index <= len(queries)
+                and isinstance(expanded_query, str) and expanded_query.strip()
+            ):
+                expanded[index - 1] = expanded_query.strip().strip('"')
+        return expanded
+    
+    @staticmethod
+    def _parse_batch_response(response: str) -> list:
+        """Extract the JSON array from a batch expansion response"""
+        if "```json" in response:
+            json_str = response.split("```json")[1].split("```")[0].strip()
+        elif "```" in response:
+            json_str = response.split("```")[1].strip()
+        else:
+            json_str = response.strip()
+        items = json.loads(json_str)
+        if not isinstance(items, list):
+            raise ValueError("Response is not a JSON array")
+        return items
\ No newline at end of file
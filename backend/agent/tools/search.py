@@ -1,45 +1,195 @@
-from typing import List, Dict, Any
-import sys
+from typing import List, Dict, Any, Optional
 import os
 import json
+import math
+import asyncio
+import time
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 load_dotenv() 
-# Add parent directory to path to import utils
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils import search_web
+from utils import call_slot, search_web
+from cache import LRUCache
+from search_index import SearchIndex
+from singleflight import SingleFlight
+import metrics
+
+# Default location of the local full-text index of retrieved results
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    ".cache",
+    "search_index.sqlite3"
+)
 
 class SearchTool:
     """
     Tool to search the web for information
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        cache_ttl: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        index: Optional[SearchIndex] = None,
+        local_first: Optional[bool] = None,
+        local_recall_threshold: Optional[float] = None,
+        local_min_coverage: Optional[float] = None
+    ):
         self.__name__ = "search_tool"
         self.api_key = os.getenv("SERPAPI_API_KEY")
         if not self.api_key:
             print("WARNING: SEARCH_API_KEY environment variable not set. Search functionality will be limited.")
             # Use a mock API key for development
             self.api_key = "mock_api_key"
+        
+        # Result cache keyed on the normalized query; a TTL of 0 disables it
+        if cache_ttl is None:
+            cache_ttl = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+        if cache_size is None:
+            cache_size = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+        self.cache = LRUCache(max_entries=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+        
+        # Every live result is persisted into a local full-text index. In
+        # local-first mode the index answers a query when enough indexed
+        # results match it: at least local_recall_threshold * max_results
+        # results, each containing local_min_coverage of the query terms.
+        if index is None:
+            index_path = os.getenv("SEARCH_INDEX_PATH", DEFAULT_INDEX_PATH)
+            max_age = float(os.getenv("SEARCH_INDEX_MAX_AGE", str(30 * 86400)))
+            index = SearchIndex(index_path, max_age=max_age or None) if index_path else None
+        self.index = index
+        if local_first is None:
+            local_first = os.getenv("SEARCH_LOCAL_FIRST", "0").lower() in ("1", "true", "yes")
+        self.local_first = local_first
+        if local_recall_threshold is None:
+            local_recall_threshold = float(os.getenv("SEARCH_LOCAL_RECALL", "1.0"))
+        self.local_recall_threshold = local_recall_threshold
+        if local_min_coverage is None:
+            local_min_coverage = float(os.getenv("SEARCH_LOCAL_MIN_COVERAGE", "0.5"))
+        self.local_min_coverage = local_min_coverage
+        
+        # Identical searches in flight at the same time, from one research run
+        # or several, share a single request
+        self._flights = SingleFlight()
     
-    async def __call__(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    async def __call__(self, query: str, max_results: int = 5, use_cache: bool = True) -> List[Dict[str, Any]]:
         """
         Search the web for information
         
         Args:
             query: The search query
             max_results: Maximum number of results to return
+            use_cache: Whether to answer from (and populate) the result cache
             
         Returns:
             A list of search result dictionaries
         """
+        start = time.perf_counter()
+        cache_key = self.normalize_query(query)
+        if use_cache and self.cache is not None:
+            cached = self._get_cached(cache_key, max_results)
+            if cached is not None:
+                self._record_search("cache", start, cached)
+                return cached
+        
+        results = await self._flights.do((cache_key, max_results), lambda: self._fetch(query, max_results, start))
+        # Joined callers receive the same list, so hand each caller its own copies
+        results = [dict(result) for result in results]
+        
+        if use_cache and self.cache is not None:
+            self._store_cached(cache_key, max_results, results)
+        return results
+    
+    async def _fetch(self, query: str, max_results: int, start: float) -> List[Dict[str, Any]]:
+        """
+        Fetch results from the mock backend, the local index or the live API
+        """
         # If using mock data for development
         if self.api_key == "mock_api_key":
-            return self._mock_search(query, max_results)
+            results = self._mock_search(query, max_results)
+            self._record_search("mock", start, results)
+            return results
+        
+        loop = asyncio.get_event_loop()
+        if self.local_first and self.index is not None:
+            results = await loop.run_in_executor(
+                None,
+                lambda: self._search_local(query, max_results)
+            )
+            if results is not None:
+                self._record_search("local", start, results)
+                return results
         
-        # Real search
-        results = search_web(query, self.api_key, max_results)
+        # Real search - run the blocking client in a thread so that
+        # concurrent searches do not stall the event loop
+        async with call_slot():
+            results = await loop.run_in_executor(
+                None,
+                lambda: search_web(query, self.api_key, max_results)
+            )
+        self._record_search("live", start, results)
+        if self.index is not None:
+            await loop.run_in_executor(None, lambda: self._index_results(query, results))
         return results
     
+    def _search_local(self, query: str, max_results: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Answer a query from the local index, or return None if local recall is too low
+        """
+        try:
+            hits = self.index.search(query, limit=max_results)
+        except Exception as e:
+            print(f"Error searching local index: {e}")
+            return None
+        relevant = [hit for hit in hits if hit["coverage"] >= self.local_min_coverage]
+        if not relevant or len(relevant) < math.ceil(self.local_recall_threshold * max_results):
+            return None
+        return [
+            {"title": hit["title"], "snippet": hit["snippet"], "url": hit["url"]}
+            for hit in relevant
+        ]
+    
+    def _index_results(self, query: str, results: List[Dict[str, Any]]) -> None:
+        """Persist live results into the local index"""
+        try:
+            self.index.add(results, query)
+        except Exception as e:
+            print(f"Error updating local index: {e}")
+    
+    @staticmethod
+    def _record_search(source: str, start: float, results: List[Dict[str, Any]]) -> None:
+        """Record search latency and result count metrics"""
+        metrics.SEARCH_LATENCY.observe(time.perf_counter() - start, source=source)
+        metrics.SEARCH_RESULTS.observe(len(results), source=source)
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Normalize a query for cache lookups: case, whitespace and token order are ignored
+        """
+        return " ".join(sorted(query.lower().split()))
+    
+    def _get_cached(self, cache_key: str, max_results: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return cached results for the query, if an entry can satisfy max_results
+        
+        An entry fetched with a larger max_results also answers smaller requests,
+        and an entry that came back short of its own limit is complete for any size.
+        """
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            return None
+        cached_max, results = entry
+        if cached_max < max_results and len(results) >= cached_max:
+            return None
+        return [dict(result) for result in results[:max_results]]
+    
+    def _store_cached(self, cache_key: str, max_results: int, results: List[Dict[str, Any]]) -> None:
+        """Cache results unless a larger entry for the same query is already cached"""
+        entry = self.cache.get(cache_key)
+        if entry is not None and entry[0] >= max_results:
+            return
+        self.cache.set(cache_key, (max_results, [dict(result) for result in results]))
+    
     def _mock_search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
         """
         Mock search function for development/testing
@@ -57,6 +207,6 @@ class SearchTool:
             mock_results.append({
                 "title": f"Result {i+1} for {query}",
                 "snippet": f"This is a snippet of information related to {query}. It contains relevant details that would be useful for research.",
-                "url": f"https://example.com/result-{i+1}"
+                "url": f"https://example.com/result-{i+1}?q={quote_plus(query)}"
             })
-        return mock_results
\ No newline at end of file
+        return mock_results
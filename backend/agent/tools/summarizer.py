@@ -1,32 +1,85 @@
-from typing import Dict, List, Any
-import sys
+from typing import Dict, List, Any, Optional, Tuple
 import os
+import re
+import asyncio
 
-# Add parent directory to path to import utils
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils import generate_gemini_response, format_results_for_llm
+from utils import (
+    generate_gemini_response,
+    generate_gemini_response_stream,
+    format_results_for_llm,
+    is_failed_response,
+    tokenize
+)
+from context_packer import BM25, STOPWORDS, ContextPacker
+
+# Bracketed source citations such as [3], with the whitespace before them
+CITATION_PATTERN = re.compile(r"\s*\[(\d+)\]")
 
 class SummarizerTool:
     """
     Tool to summarize search results into a coherent summary
+    
+    The final summary is generated with streaming, so its text is forwarded
+    to the caller's token sink (if any) while it is being written.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        map_reduce_threshold: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        fan_out: Optional[int] = None
+    ):
         self.__name__ = "summarizer_tool"
+        # Keeps the prompt bounded no matter how many results come in
+        self.packer = ContextPacker(token_budget=token_budget)
+        
+        # With more than map_reduce_threshold results (0 disables), results are
+        # summarized in parallel chunks of chunk_size per subtopic, and the
+        # partial summaries are merged at most fan_out at a time
+        if map_reduce_threshold is None:
+            map_reduce_threshold = int(os.getenv("SUMMARY_MAP_REDUCE_THRESHOLD", "40"))
+        self.map_reduce_threshold = map_reduce_threshold
+        if chunk_size is None:
+            chunk_size = int(os.getenv("SUMMARY_CHUNK_SIZE", "10"))
+        self.chunk_size = max(1, chunk_size)
+        if fan_out is None:
+            fan_out = int(os.getenv("SUMMARY_FAN_OUT", "6"))
+        self.fan_out = max(2, fan_out)
     
-    async def __call__(self, topic: str, search_results: List[Dict[str, Any]]) -> str:
+    async def __call__(
+        self,
+        topic: str,
+        search_results: List[Dict[str, Any]],
+        subtopics: Optional[List[str]] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
         """
         Generate a research summary from search results
         
         Args:
             topic: The research topic
             search_results: The search results to summarize
+            subtopics: Optional subtopics, used to rank results for the prompt
+            token_budget: Optional cap on the tokens of search results in the prompt
             
         Returns:
             A summary paragraph
         """
-        # Format the search results for the LLM
-        formatted_results = format_results_for_llm(search_results)
+        # Large result sets are summarized with map-reduce, unless the prompt
+        # budget was cut below the default (map-reduce spends more in total)
+        if (
+            self.map_reduce_threshold > 0
+            and len(search_results) > self.map_reduce_threshold
+            and (token_budget is None or token_budget >= self.packer.token_budget)
+        ):
+            summary = await self.map_reduce(topic, search_results, subtopics)
+            if summary is not None:
+                return summary
+        
+        # Pack the most relevant results into the token budget and format them for the LLM
+        packed_results = self.packer.pack(search_results, topic, subtopics, token_budget)
+        formatted_results = format_results_for_llm(packed_results)
         
         prompt = f"""
         You are a research assistant tasked with creating a concise, informative summary 
@@ -47,9 +100,214 @@ class SummarizerTool:
         WRITE ONLY THE SUMMARY, without any introductions or explanations.
         """
         
-        summary = await generate_gemini_response(prompt)
+        summary = await generate_gemini_response_stream(prompt, tool_name=self.__name__)
+        
+        # Clean up the summary
+        summary = summary.strip()
+        
+        return summary
+    
+    async def map_reduce(
+        self,
+        topic: str,
+        search_results: List[Dict[str, Any]],
+        subtopics: Optional[List[str]] = None
+    ) -> Optional[str]:
+        """
+        Summarize many search results with parallel map calls and a reduce step
+        
+        Results are grouped by their best-matching subtopic and split into
+        chunks of chunk_size; each chunk is summarized by its own call, all in
+        parallel. Partial summaries are then merged fan_out at a time, in as
+        many rounds as needed, into the final summary. Citations such as [3]
+        refer to the position of the result in search_results, counting from 1.
+        
+        Args:
+            topic: The research topic
+            search_results: The search results to summarize
+            subtopics: Optional subtopics, used to group the results
+            
+        Returns:
+            A summary paragraph with citations, or None if every map call failed
+        """
+        chunks = self._group(topic, search_results, subtopics)
+        partials = await asyncio.gather(*(
+            self._summarize_chunk(topic, aspect, search_results, indices)
+            for aspect, indices in chunks
+        ))
+        partials = [partial for partial in partials if not is_failed_response(partial)]
+        if not partials:
+            return None
+        
+        while len(partials) > 1:
+            final = len(partials) <= self.fan_out
+            groups = [partials[i:i + self.fan_out] for i in range(0, len(partials), self.fan_out)]
+            merged = await asyncio.gather(*(self._merge(topic, group, final) for group in groups))
+            # A failed merge keeps its inputs rather than losing them
+            remaining = []
+            for group, summary in zip(groups, merged):
+                remaining.extend(group if is_failed_response(summary) else [summary])
+            merged_any = len(remaining) < len(partials)
+            partials = remaining
+            # Stop once a round merges nothing, instead of retrying the same groups forever
+            if final or not merged_any:
+                break
+        summary = partials[0] if len(partials) == 1 else "\n\n".join(partials)
+        # Drop citations the model invented
+        return CITATION_PATTERN.sub(
+            lambda match: match.group(0) if 1 <= int(match.group(1)) <= len(search_results) else "",
+            summary
+        ).strip()
+    
+    def _group(
+        self,
+        topic: str,
+        search_results: List[Dict[str, Any]],
+        subtopics: Optional[List[str]] = None
+    ) -> List[Tuple[str, List[int]]]:
+        """
+        Split result indices into (aspect, indices) chunks, grouped by best-matching subtopic
+        """
+        groups: Dict[str, List[int]] = {}
+        if subtopics:
+            bm25 = BM25([
+                tokenize(f"{result.get('title', '')} {result.get('snippet', '')}")
+                for result in search_results
+            ])
+            scores = [
+                bm25.scores([term for term in tokenize(subtopic) if term not in STOPWORDS])
+                for subtopic in subtopics
+            ]
+            for i in range(len(search_results)):
+                best = max(range(len(subtopics)), key=lambda s: scores[s][i])
+                aspect = subtopics[best] if scores[best][i] > 0 else topic
+                groups.setdefault(aspect, []).append(i)
+        else:
+            groups[topic] = list(range(len(search_results)))
+        return [
+            (aspect, indices[start:start + self.chunk_size])
+            for aspect, indices in groups.items()
+            for start in range(0, len(indices), self.chunk_size)
+        ]
+    
+    async def _summarize_chunk(
+        self,
+        topic: str,
+        aspect: str,
+        search_results: List[Dict[str, Any]],
+        indices: List[int]
+    ) -> str:
+        """Map step: summarize one chunk of results, citing their original numbers"""
+        chunk = []
+        for i in indices:
+            entry = dict(search_results[i])
+            entry["source_index"] = i + 1
+            chunk.append(entry)
+        packed_results = self.packer.pack(chunk, topic, [aspect])
+        formatted_results = format_results_for_llm(
+            packed_results,
+            numbers=[result["source_index"] for result in packed_results]
+        )
+        
+        prompt = f"""
+        You are a research assistant summarizing part of the research on the topic: "{topic}"
+        These search results mainly cover: "{aspect}"
+        
+        {formatted_results}
+        
+        Guidelines:
+        - Write 2-4 sentences with the key facts from these search results
+        - After each fact, cite the supporting results by their numbers in brackets, e.g. [3] or [3][7]
+        - Only use the numbers shown above
+        - Do not include personal opinions or speculation
+        
+        WRITE ONLY THE SUMMARY, without any introductions or explanations.
+        """
+        
+        try:
+            return (await generate_gemini_response(prompt, tool_name=self.__name__)).strip()
+        except Exception as e:
+            print(f"Error summarizing chunk '{aspect}': {e}")
+            return ""
+    
+    async def _merge(self, topic: str, partials: List[str], final: bool) -> str:
+        """Reduce step: merge partial summaries, keeping their citations"""
+        numbered_partials = "\n\n".join(
+            f"PARTIAL SUMMARY {i}:\n{partial}" for i, partial in enumerate(partials, 1)
+        )
+        length = "approximately 1 paragraph (5-7 sentences)" if final else "3-5 sentences"
+        
+        prompt = f"""
+        You are a research assistant combining partial research summaries on the topic: "{topic}"
+        
+        {numbered_partials}
+        
+        Guidelines:
+        - Merge the partial summaries into one coherent summary of {length}
+        - Keep every bracketed citation such as [3] attached to the fact it supports, unchanged
+        - Remove repetition and organize information in a logical flow
+        - Maintain a neutral, informative tone
+        - Do not add information that is not in the partial summaries
+        
+        WRITE ONLY THE SUMMARY, without any introductions or explanations.
+        """
+        
+        # Only the final merge is streamed to the client
+        generate = generate_gemini_response_stream if final else generate_gemini_response
+        try:
+            return (await generate(prompt, tool_name=self.__name__)).strip()
+        except Exception as e:
+            print(f"Error merging partial summaries: {e}")
+            return ""
+    
+    async def update(
+        self,
+        topic: str,
+        previous_summary: str,
+        new_results: List[Dict[str, Any]],
+        subtopics: Optional[List[str]] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
+        """
+        Revise an existing summary using only newly found search results
+        
+        Args:
+            topic: The research topic
+            previous_summary: The summary produced by an earlier pass
+            new_results: Search results not seen by the earlier pass
+            subtopics: Optional subtopics, used to rank results for the prompt
+            token_budget: Optional cap on the tokens of search results in the prompt
+            
+        Returns:
+            The revised summary paragraph
+        """
+        packed_results = self.packer.pack(new_results, topic, subtopics, token_budget)
+        formatted_results = format_results_for_llm(packed_results)
+        
+        prompt = f"""
+        You are a research assistant revising a research summary on the topic: "{topic}"
+        
+        CURRENT SUMMARY:
+        {previous_summary}
+        
+        NEW SEARCH RESULTS:
+        
+        {formatted_results}
+        
+        Guidelines:
+        - Integrate relevant facts from the new search results into the current summary
+        - Correct the current summary where the new results contradict it
+        - Keep information from the current summary that is still accurate
+        - Write approximately 1 paragraph (5-7 sentences)
+        - Maintain a neutral, informative tone
+        - Do not include personal opinions or speculation
+        
+        WRITE ONLY THE REVISED SUMMARY, without any introductions or explanations.
+        """
+        
+        summary = await generate_gemini_response_stream(prompt, tool_name=self.__name__)
         
         # Clean up the summary
         summary = summary.strip()
         
-        return summary
\ No newline at end of file
+        return summary
@@ -1,11 +1,7 @@
 from typing import List, Dict, Any
-import sys
-import os
 import json
 import traceback
 
-# Add parent directory to path to import utils
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from utils import generate_gemini_response
 
 class TopicBreakdownTool:
@@ -41,7 +37,7 @@ class TopicBreakdownTool:
             
             try:
                 # Use async function to get the response
-                response = await generate_gemini_response(prompt, model_name="gemini-1.5-flash")
+                response = await generate_gemini_response(prompt, tool_name=self.__name__)
                 
             except Exception as e:
                 print(f"Error calling generate_gemini_response: {e}")
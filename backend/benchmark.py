@@ -0,0 +1,346 @@
+"""
+Offline benchmark and load test for the research pipeline
+
+Replaces generate_gemini_response(_stream) and search_web with local fake backends
+(configurable latency, failure rate and response size) and drives either
+ResearchAgentGraph.run directly or the FastAPI app in-process, reporting
+latency percentiles, throughput and LLM/search calls per request. No network
+access or API keys are needed.
+
+`--mode import` instead measures the cold import time of the app module in
+fresh interpreters and fails when the median exceeds --import-budget-ms.
+
+Usage (from the backend directory):
+    python benchmark.py --mode graph --requests 200 --concurrency 20
+    python benchmark.py --mode app --requests 100 --concurrency 50 --llm-latency-ms 300
+    python benchmark.py --mode import --import-budget-ms 800
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Keep the real backends and their caches out of the way before anything imports utils
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import token_sink, track_llm_usage
+
+
+class LatencyDistribution:
+    """
+    Log-normal latency distribution described by its median and spread
+    """
+
+    def __init__(self, median_ms: float, sigma: float = 0.5):
+        self.median_ms = median_ms
+        self.sigma = sigma
+
+    def sample(self) -> float:
+        """Draw a latency in seconds"""
+        if self.median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+
+class FakeLLM:
+    """
+    Stand-in for generate_gemini_response that answers each tool's prompt format
+    """
+
+    def __init__(self, latency: LatencyDistribution, failure_rate: float = 0.0, response_chars: int = 800):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.response_chars = response_chars
+        self.calls = 0
+        self.failures = 0
+        self.prompt_chars = 0
+
+    async def __call__(self, prompt: str, model_name: Optional[str] = None, use_cache: bool = True, tool_name: str = "unknown", **kwargs) -> str:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.latency.sample())
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            # The real client never raises; it returns an error string
+            return "生成响应时出错: simulated failure"
+        response = self._respond(prompt)
+        # Charge the run's budget like the real client does
+        track_llm_usage(prompt, response)
+        return response
+
+    async def stream(self, prompt: str, model_name: Optional[str] = None, use_cache: bool = True, tool_name: str = "unknown", **kwargs) -> str:
+        """Stand-in for generate_gemini_response_stream: forwards the response word by word"""
+        response = await self(prompt, model_name, use_cache, tool_name)
+        sink = token_sink.get()
+        if sink is not None:
+            for word in response.split(" "):
+                sink(word + " ")
+        return response
+
+    def _respond(self, prompt: str) -> str:
+        if "ORIGINAL QUERIES:" in prompt:
+            lines = prompt.split("ORIGINAL QUERIES:")[1].split("FORMAT YOUR RESPONSE")[0].strip().splitlines()
+            return json.dumps([
+                {"index": i, "expanded_query": f"{line.split('. ', 1)[-1].strip()} overview research"}
+                for i, line in enumerate(lines, 1)
+            ])
+        if "ORIGINAL QUERY:" in prompt:
+            query = prompt.split("ORIGINAL QUERY:")[1].splitlines()[0].strip()
+            return f"{query} overview research"
+        if "TOPIC:" in prompt and "JSON ARRAY" in prompt:
+            topic = prompt.split("TOPIC:")[1].splitlines()[0].strip()
+            return json.dumps([f"{topic} {aspect}" for aspect in ("history", "applications", "challenges", "outlook")])
+        if "critique specialist" in prompt:
+            return json.dumps({
+                "critique": self._text(self.response_chars // 2),
+                "needs_refinement": False,
+                "refinement_queries": []
+            })
+        return self._text(self.response_chars)
+
+    @staticmethod
+    def _text(chars: int) -> str:
+        sentence = "The research indicates measurable progress alongside open questions. "
+        return (sentence * (chars // len(sentence) + 1))[:chars]
+
+
+class FakeSearch:
+    """
+    Stand-in for search_web (blocking, like the real client)
+    """
+
+    def __init__(self, latency: LatencyDistribution, failure_rate: float = 0.0, snippet_chars: int = 300):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.snippet_chars = snippet_chars
+        self.calls = 0
+        self.failures = 0
+
+    def __call__(self, query: str, api_key: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            raise ConnectionError("simulated search failure")
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")
+        words = query.split() or ["result"]
+        return [
+            {
+                "title": f"{query} - source {i + 1}",
+                "snippet": " ".join(random.choice(words) + f" fact{random.randint(0, 10000)}" for _ in range(self.snippet_chars // 12)),
+                "url": f"https://source{i + 1}.example.org/{slug}"
+            }
+            for i in range(max_results)
+        ]
+
+
+def install_fakes(graph, llm: FakeLLM, search: FakeSearch, search_cache: bool = False) -> None:
+    """
+    Point every tool module at the fake backends and switch the graph's
+    search tool to its live (non-mock) code path
+    """
+    for name, module in list(sys.modules.items()):
+        if module is None:
+            continue
+        if name.endswith("tools.search") and hasattr(module, "search_web"):
+            module.search_web = search
+        elif name.startswith("agent.tools.") and hasattr(module, "generate_gemini_response"):
+            module.generate_gemini_response = llm
+            if hasattr(module, "generate_gemini_response_stream"):
+                module.generate_gemini_response_stream = llm.stream
+    graph.search_tool.api_key = "benchmark"
+    # Fake results must not leak into the persistent local index
+    graph.search_tool.index = None
+    if not search_cache:
+        graph.search_tool.cache = None
+        graph.topic_cache = None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def drive(request_fn, requests: int, concurrency: int, topics: List[str]) -> Dict[str, Any]:
+    """
+    Issue `requests` calls of request_fn(topic) with at most `concurrency` in flight
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request_fn(topics[i % len(topics)])
+            except Exception as e:
+                errors += 1
+                print(f"Request {i} failed: {e}", file=sys.stderr)
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "max_s": max(latencies) if latencies else 0.0
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    llm = FakeLLM(
+        LatencyDistribution(args.llm_latency_ms, args.llm_latency_sigma),
+        failure_rate=args.llm_failure_rate,
+        response_chars=args.llm_response_chars
+    )
+    search = FakeSearch(
+        LatencyDistribution(args.search_latency_ms, args.search_latency_sigma),
+        failure_rate=args.search_failure_rate,
+        snippet_chars=args.snippet_chars
+    )
+    topics = [f"{args.topic} {i}" for i in range(args.distinct_topics)] if args.distinct_topics > 1 else [args.topic]
+
+    if args.mode == "graph":
+        from agent.langagent import ResearchAgentGraph
+        graph = ResearchAgentGraph(pipelined=args.pipelined)
+        install_fakes(graph, llm, search, args.search_cache)
+
+        async def request_fn(topic: str):
+            await graph.run({"topic": topic, "max_results": args.max_results})
+    else:
+        import httpx
+        import main
+        install_fakes(main.research_agent, llm, search, args.search_cache)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://benchmark",
+            timeout=None
+        )
+
+        async def request_fn(topic: str):
+            response = await client.post("/api/research", json={"topic": topic, "max_results": args.max_results})
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    report = await drive(request_fn, args.requests, args.concurrency, topics)
+    if args.mode == "app":
+        await client.aclose()
+
+    completed = max(1, args.requests - report["errors"])
+    report.update({
+        "mode": args.mode,
+        "llm_calls_per_request": llm.calls / completed,
+        "llm_failures": llm.failures,
+        "llm_prompt_chars_per_request": llm.prompt_chars / completed,
+        "search_calls_per_request": search.calls / completed,
+        "search_failures": search.failures
+    })
+    return report
+
+
+def measure_import_time(module: str, runs: int) -> Dict[str, Any]:
+    """
+    Import `module` in fresh interpreters and report the import wall time
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", code],
+            cwd=backend_dir,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return {
+        "mode": "import",
+        "module": module,
+        "runs": runs,
+        "median_ms": statistics.median(samples) * 1000,
+        "max_ms": max(samples) * 1000
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline research pipeline benchmark")
+    parser.add_argument("--mode", choices=["graph", "app", "import"], default="graph",
+                        help="Drive ResearchAgentGraph.run directly, the FastAPI app in-process, "
+                             "or measure cold import time")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--topic", default="benchmark topic")
+    parser.add_argument("--distinct-topics", type=int, default=1000,
+                        help="Number of distinct topics to cycle through (1 = identical requests)")
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="Median fake LLM latency")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5, help="Log-normal spread of LLM latency")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-response-chars", type=int, default=800)
+    parser.add_argument("--search-latency-ms", type=float, default=100, help="Median fake search latency")
+    parser.add_argument("--search-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--snippet-chars", type=int, default=300)
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Search each subtopic as soon as its expansion completes (graph mode)")
+    parser.add_argument("--search-cache", action="store_true",
+                        help="Keep SearchTool's result cache and the topic cache enabled")
+    parser.add_argument("--import-module", default="main", help="Module timed by --mode import")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1000,
+                        help="Maximum median import time for --mode import")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.mode == "import":
+        report = measure_import_time(args.import_module, args.import_runs)
+        report["budget_ms"] = args.import_budget_ms
+        failed = report["median_ms"] > args.import_budget_ms
+    else:
+        report = asyncio.run(run_benchmark(args))
+        failed = report["errors"] > 0
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>30}: {value:.4f}" if isinstance(value, float) else f"{key:>30}: {value}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
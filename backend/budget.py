@@ -0,0 +1,117 @@
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+# Defaults for requests that do not set their own limits; 0 means unlimited
+DEFAULT_MAX_ITERATIONS = int(os.getenv("RESEARCH_MAX_ITERATIONS", "3"))
+DEFAULT_TIME_BUDGET = float(os.getenv("RESEARCH_TIME_BUDGET", "0"))
+DEFAULT_CHAR_BUDGET = int(os.getenv("RESEARCH_CHAR_BUDGET", "0"))
+# Share of the time and size budgets held back for the final summary; once
+# less than this remains, optional stages are skipped
+RESERVE_FRACTION = float(os.getenv("RESEARCH_BUDGET_RESERVE", "0.2"))
+
+# The budget lives in the agent state as a plain dict so that it survives
+# checkpointing; these functions are the only code that reads or updates it
+
+
+def new_budget(
+    max_iterations: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    char_budget: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Create the budget for one research run
+
+    Args:
+        max_iterations: Maximum refinement passes after the first search
+        time_budget: Wall-clock seconds for the whole run (0 for no deadline)
+        char_budget: Prompt plus response characters across all LLM calls (0 for no limit)
+
+    Returns:
+        A serializable budget dictionary
+    """
+    if max_iterations is None:
+        max_iterations = DEFAULT_MAX_ITERATIONS
+    if time_budget is None:
+        time_budget = DEFAULT_TIME_BUDGET
+    if char_budget is None:
+        char_budget = DEFAULT_CHAR_BUDGET
+    now = time.time()
+    return {
+        "max_iterations": max(0, max_iterations),
+        "started_at": now,
+        "deadline": now + time_budget if time_budget > 0 else None,
+        "char_budget": char_budget if char_budget > 0 else None,
+        "used_chars": 0,
+        "llm_calls": 0
+    }
+
+
+def resume(budget: Optional[Dict[str, Any]], paused_at: float) -> None:
+    """
+    Restart the clock of a resumed run, so that the time between paused_at
+    (its last checkpoint) and now does not count against its time budget
+    """
+    if not budget:
+        return
+    spent = max(0.0, paused_at - budget["started_at"])
+    started_at = time.time() - spent
+    if budget.get("deadline") is not None:
+        budget["deadline"] = started_at + (budget["deadline"] - budget["started_at"])
+    budget["started_at"] = started_at
+
+
+def charge(budget: Dict[str, Any], chars: int, calls: int = 1) -> None:
+    """Record LLM usage against the budget"""
+    budget["used_chars"] = budget.get("used_chars", 0) + chars
+    budget["llm_calls"] = budget.get("llm_calls", 0) + calls
+
+
+def remaining_fraction(budget: Optional[Dict[str, Any]]) -> float:
+    """
+    Fraction of the tightest of the time and size budgets still available
+    """
+    if not budget:
+        return 1.0
+    fractions = [1.0]
+    deadline = budget.get("deadline")
+    if deadline is not None:
+        total = deadline - budget["started_at"]
+        fractions.append((deadline - time.time()) / total if total > 0 else 0.0)
+    char_budget = budget.get("char_budget")
+    if char_budget is not None:
+        fractions.append(1 - budget.get("used_chars", 0) / char_budget)
+    return max(0.0, min(fractions))
+
+
+def is_exhausted(budget: Optional[Dict[str, Any]]) -> bool:
+    """Whether the deadline has passed or the size budget is used up"""
+    return remaining_fraction(budget) <= 0
+
+
+def is_nearly_spent(budget: Optional[Dict[str, Any]]) -> bool:
+    """Whether only the reserve for the final summary is left"""
+    return remaining_fraction(budget) < RESERVE_FRACTION
+
+
+def can_refine(budget: Optional[Dict[str, Any]], iterations: int) -> bool:
+    """
+    Whether another refinement pass is allowed after `iterations` search passes
+    """
+    if budget is None:
+        return True
+    return iterations - 1 < budget["max_iterations"] and not is_nearly_spent(budget)
+
+
+def context_tokens(budget: Optional[Dict[str, Any]], default: int) -> int:
+    """
+    Token budget for search results packed into a prompt
+
+    With a size budget, a prompt's context is capped at half of the characters
+    left (about four characters per token), but never below a useful minimum.
+    """
+    if not budget or budget.get("char_budget") is None:
+        return default
+    remaining_chars = budget["char_budget"] - budget.get("used_chars", 0)
+    return max(min(default, 200), min(default, math.floor(remaining_chars / 8)))
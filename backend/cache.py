@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with optional per-entry TTL
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries when full"""
+        with self._lock:
+            self._entries[key] = (value, stored_at if stored_at is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache stored in a local SQLite file
+
+    Entries expire after `ttl` seconds; once the store holds more than
+    `max_entries`, the least recently accessed entries are evicted. Reads do
+    not write: access times are buffered and saved with the next write (or
+    once `flush_every` are pending), and expiry and eviction run every
+    `evict_every` writes, so the store may briefly exceed `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 50000,
+        ttl: Optional[float] = None,
+        flush_every: int = 256,
+        evict_every: int = 100
+    ):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.flush_every = max(1, flush_every)
+        self.evict_every = max(1, evict_every)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._accessed: Dict[str, float] = {}
+        self._writes = 0
+
+    def open(self) -> sqlite3.Connection:
+        """Open the database on first use, creating the schema if needed"""
+        if self._conn is not None:
+            return self._conn
+        with self._lock:
+            if self._conn is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+                conn.commit()
+                self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return (value, created_at), or None if missing or expired"""
+        now = time.time()
+        conn = self.open()
+        with self._lock:
+            row = conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            # Expired rows are left for the next eviction pass
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= self.flush_every:
+                self._flush_accessed(conn)
+                conn.commit()
+            return row[0], row[1]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value, periodically evicting expired or least recently used entries"""
+        now = time.time()
+        conn = self.open()
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._accessed.pop(key, None)
+            self._flush_accessed(conn)
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(conn, now)
+            conn.commit()
+
+    def _flush_accessed(self, conn: sqlite3.Connection) -> None:
+        """Save buffered access times (caller holds the lock and commits)"""
+        if self._accessed:
+            conn.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Delete expired entries, then the least recently accessed beyond max_entries"""
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created_at < ?", (now - self.ttl,))
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        conn = self.open()
+        with self._lock:
+            self._accessed.clear()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+
+class LLMResponseCache:
+    """
+    Two-tier, content-addressed cache for LLM responses
+
+    Keys are a SHA-256 hash of (model_name, prompt). Lookups hit an in-memory
+    LRU first and fall back to an optional SQLite store; disk hits are
+    promoted into memory.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = 86400,
+        memory_entries: int = 1024,
+        disk_entries: int = 50000
+    ):
+        self.memory = LRUCache(max_entries=memory_entries, ttl=ttl)
+        self.disk = SQLiteCache(path, max_entries=disk_entries, ttl=ttl) if path else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        """Return the cached response for (model_name, prompt), if any"""
+        key = self.make_key(model_name, prompt)
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        return self._get_disk(key)
+
+    async def get_async(self, model_name: str, prompt: str) -> Optional[str]:
+        """get() for async callers: the disk tier is read in a worker thread"""
+        key = self.make_key(model_name, prompt)
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return self._get_disk(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key)
+
+    def set(self, model_name: str, prompt: str, response: str) -> None:
+        """Store a successful response in both tiers"""
+        key = self.make_key(model_name, prompt)
+        self.memory.set(key, response)
+        self._set_disk(key, response)
+
+    async def set_async(self, model_name: str, prompt: str, response: str) -> None:
+        """set() for async callers: the disk tier is written in a worker thread"""
+        key = self.make_key(model_name, prompt)
+        self.memory.set(key, response)
+        if self.disk is None:
+            self._set_disk(key, response)
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self._set_disk, key, response)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+        return value
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """Look up the disk tier after a memory miss, promoting hits into memory"""
+        if self.disk is not None:
+            try:
+                entry = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"Error reading LLM cache: {e}")
+                entry = None
+            if entry is not None:
+                value, created_at = entry
+                self.memory.set(key, value, stored_at=created_at)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _set_disk(self, key: str, response: str) -> None:
+        if self.disk is not None:
+            try:
+                self.disk.set(key, response)
+            except sqlite3.Error as e:
+                print(f"Error writing LLM cache: {e}")
+        with self._lock:
+            self.writes += 1
+
+    def open(self) -> None:
+        """Open the disk tier now instead of on the first lookup"""
+        if self.disk is not None:
+            self.disk.open()
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for both tiers"""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "memory_entries": len(self.memory)
+            }
@@ -0,0 +1,145 @@
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from utils import format_results_for_llm, tokenize
+
+# Common English words that carry no ranking signal
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "why", "with"
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting (about four characters per token)
+    """
+    return math.ceil(len(text) / 4)
+
+
+class BM25:
+    """
+    Okapi BM25 ranker over a small in-memory document collection
+    """
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(documents)
+        self.idf = {
+            term: math.log((total - frequency + 0.5) / (frequency + 0.5) + 1)
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: List[str]) -> List[float]:
+        """Score every document against the query terms"""
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+class ContextPacker:
+    """
+    Select and trim search results to fit an LLM prompt token budget
+
+    Results are ranked with BM25 against the topic and subtopics, then added
+    greedily in relevance order. Snippets are capped at `max_snippet_tokens`,
+    and a result that does not fit is trimmed further as long as at least
+    `min_snippet_tokens` of its snippet survive.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        max_snippet_tokens: int = 150,
+        min_snippet_tokens: int = 25
+    ):
+        self.token_budget = token_budget
+        self.max_snippet_tokens = max_snippet_tokens
+        self.min_snippet_tokens = min_snippet_tokens
+
+    def rank(
+        self,
+        search_results: List[Dict[str, Any]],
+        topic: str,
+        subtopics: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the results sorted by BM25 relevance (stable for ties)"""
+        if not search_results:
+            return []
+        query = [
+            term for term in tokenize(" ".join([topic] + list(subtopics or [])))
+            if term not in STOPWORDS
+        ]
+        documents = [
+            tokenize(f"{result.get('title', '')} {result.get('snippet', '')}")
+            for result in search_results
+        ]
+        scores = BM25(documents).scores(query)
+        order = sorted(range(len(search_results)), key=lambda i: -scores[i])
+        return [search_results[i] for i in order]
+
+    def pack(
+        self,
+        search_results: List[Dict[str, Any]],
+        topic: str,
+        subtopics: Optional[List[str]] = None,
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Pick the most relevant results that fit the token budget
+
+        Args:
+            search_results: Candidate search results
+            topic: The research topic
+            subtopics: Optional subtopics, used as additional query terms
+            token_budget: Overrides the packer's token budget for this call
+
+        Returns:
+            Copies of the selected results in relevance order, with trimmed snippets
+        """
+        remaining = token_budget if token_budget is not None else self.token_budget
+        packed = []
+        for result in self.rank(search_results, topic, subtopics):
+            entry = dict(result)
+            entry["snippet"] = self._trim(result.get("snippet", ""), self.max_snippet_tokens)
+            cost = estimate_tokens(format_results_for_llm([entry]))
+            if cost > remaining:
+                # Trim the snippet to whatever room is left, if that is still useful
+                overhead = cost - estimate_tokens(entry["snippet"])
+                room = remaining - overhead
+                if room < self.min_snippet_tokens:
+                    continue
+                entry["snippet"] = self._trim(entry["snippet"], room)
+                cost = estimate_tokens(format_results_for_llm([entry]))
+                if cost > remaining:
+                    continue
+            packed.append(entry)
+            remaining -= cost
+            if remaining <= 0:
+                break
+        return packed
+
+    @staticmethod
+    def _trim(text: str, max_tokens: int) -> str:
+        """Trim text to roughly max_tokens, cutting at a word boundary"""
+        max_chars = max_tokens * 4
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars - 3]
+        if " " in cut:
+            cut = cut.rsplit(" ", 1)[0]
+        return cut.rstrip() + "..."
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the job queue is at capacity
+    """
+
+    def __init__(self, queue_depth: int, queue_capacity: int, retry_after: int):
+        super().__init__(f"Job queue is full ({queue_depth}/{queue_capacity})")
+        self.queue_depth = queue_depth
+        self.queue_capacity = queue_capacity
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    A queued research run and its outcome
+    """
+
+    def __init__(self, inputs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.inputs = inputs
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+
+class JobManager:
+    """
+    Bounded job queue drained by a fixed-size pool of worker tasks
+
+    Jobs are submitted without waiting; when the queue is full, submit()
+    raises QueueFullError instead of accepting more work. Finished jobs
+    are kept for `result_ttl` seconds so their results can be polled.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        max_queue: int = 100,
+        result_ttl: float = 3600
+    ):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        # Ids of queued jobs in submission order, for queue positions
+        self._pending: "OrderedDict[str, None]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        # Exponential moving average of job duration, used for Retry-After hints
+        self._avg_duration = 30.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "running")
+
+    async def start(self) -> None:
+        """Start the worker pool"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the worker pool"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, inputs: Dict[str, Any]) -> Job:
+        """
+        Queue a research run
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        if self._queue is None:
+            raise RuntimeError("JobManager has not been started")
+        self._prune()
+        job = Job(inputs)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(self.queue_depth, self.max_queue, self.retry_after())
+        self.jobs[job.id] = job
+        self._pending[job.id] = None
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """1-based position of a queued job, or None once it has started"""
+        if job.id not in self._pending:
+            return None
+        for position, job_id in enumerate(self._pending, 1):
+            if job_id == job.id:
+                return position
+        return None
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a queue slot frees up"""
+        return max(1, math.ceil(self._avg_duration / self.workers))
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._pending.pop(job.id, None)
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await self.runner(job.inputs)
+                job.status = "completed"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Job cancelled"
+                raise
+            except Exception as e:
+                print(f"Error running job {job.id}: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - job.started_at)
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.done and job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
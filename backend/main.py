@@ -1,12 +1,59 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable
 import asyncio
-from agent.langagent import ResearchAgentGraph
-import uvicorn
+import json
+import os
+from agent.langagent import ResearchAgentGraph, ResearchRunError
+from jobs import JobManager, QueueFullError
+from singleflight import SingleFlight
+from utils import llm_cache, llm_governor, model_router, warm_up as warm_up_llm
+import metrics
+
+API_IN_FLIGHT = metrics.gauge("api_requests_in_flight", "API requests currently being served", ["endpoint"])
+
+class InFlightRoute(APIRoute):
+    """
+    API route that counts its requests in api_requests_in_flight, labelled by
+    route template to keep cardinality bounded. Streaming responses count
+    until their body has been sent.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not self.path.startswith("/api/"):
+            return handler
+
+        async def tracked_handler(request):
+            if not metrics.METRICS_ENABLED:
+                return await handler(request)
+            endpoint = request.scope["route"].path
+            API_IN_FLIGHT.inc(endpoint=endpoint)
+            try:
+                response = await handler(request)
+            except BaseException:
+                API_IN_FLIGHT.dec(endpoint=endpoint)
+                raise
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _release_in_flight(response.body_iterator, endpoint)
+            else:
+                API_IN_FLIGHT.dec(endpoint=endpoint)
+            return response
+
+        return tracked_handler
+
+async def _release_in_flight(body: AsyncIterator, endpoint: str) -> AsyncIterator:
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        API_IN_FLIGHT.dec(endpoint=endpoint)
 
 app = FastAPI(title="Research Agent API")
+app.router.route_class = InFlightRoute
 
 # Enable CORS
 app.add_middleware(
@@ -18,19 +65,132 @@ app.add_middleware(
 )
 
 # Pydantic models
-class ResearchRequest(BaseModel):
+class ResearchBudget(BaseModel):
+    # Maximum refinement passes after the first search
+    max_iterations: Optional[int] = None
+    # Wall-clock seconds for the whole run
+    time_budget: Optional[float] = None
+    # Prompt plus response characters across all LLM calls
+    char_budget: Optional[int] = None
+
+    def budget_inputs(self) -> Dict[str, Any]:
+        return {
+            "max_iterations": self.max_iterations,
+            "time_budget": self.time_budget,
+            "char_budget": self.char_budget
+        }
+
+class ResearchRequest(ResearchBudget):
     topic: str
     max_results: Optional[int] = 5
+    # Id to resume the run by if it fails; generated when omitted
+    run_id: Optional[str] = None
+
+    def inputs(self) -> Dict[str, Any]:
+        """Agent run inputs for this request"""
+        return {
+            "topic": self.topic,
+            "max_results": self.max_results,
+            "run_id": self.run_id,
+            **self.budget_inputs()
+        }
+
+class BatchResearchRequest(ResearchBudget):
+    topics: List[str]
+    max_results: Optional[int] = 5
+    # Maximum LLM and search calls in flight for the batch, capped by BATCH_CONCURRENCY
+    concurrency: Optional[int] = None
 
 class ResearchResponse(BaseModel):
     summary: str
     subtopics: List[str]
     search_results: List[Dict[str, Any]]
     critique: Optional[str] = None
+    run_id: Optional[str] = None
+    budget: Optional[Dict[str, Any]] = None
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_depth: int
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_position: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+def to_research_response(result: Dict[str, Any]) -> ResearchResponse:
+    """
+    Convert an agent result into the API response model
+    """
+    return ResearchResponse(
+        summary=result["summary"],
+        subtopics=result["subtopics"],
+        search_results=result["search_results"],
+        critique=result.get("critique"),
+        run_id=result.get("run_id"),
+        budget=result.get("budget")
+    )
 
 # Initialize the agent
 research_agent = ResearchAgentGraph()
 
+# Concurrent identical research requests share a single agent run
+research_flights = SingleFlight()
+
+async def run_research(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the agent, joining an identical run already in flight if there is one
+    
+    Requests are identical when their topics match ignoring case and
+    whitespace and all their other inputs (max_results, run_id, budgets) are equal.
+    """
+    key = (" ".join(inputs["topic"].split()).casefold(),) + tuple(
+        sorted((name, value) for name, value in inputs.items() if name != "topic")
+    )
+    return await research_flights.do(key, lambda: research_agent.run(inputs))
+
+# Background job queue drained by a fixed-size worker pool
+job_manager = JobManager(
+    run_research,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queue=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", "3600"))
+)
+
+# Warm up the LLM client and build the graph at startup rather than on the first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+
+@app.on_event("startup")
+async def open_checkpoints():
+    # Must run before the graph is compiled so that it is built with the checkpointer
+    await research_agent.open_checkpointer()
+
+@app.on_event("shutdown")
+async def close_checkpoints():
+    await research_agent.close_checkpointer()
+
+@app.on_event("startup")
+async def warm_up():
+    if not WARMUP_ON_STARTUP:
+        return
+    loop = asyncio.get_running_loop()
+    # SDK import and graph compilation are blocking, so keep them off the event loop
+    await loop.run_in_executor(None, warm_up_llm)
+    await loop.run_in_executor(None, research_agent.warm_up)
+
+@app.on_event("startup")
+async def start_job_workers():
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_manager.stop()
+
 @app.post("/api/research", response_model=ResearchResponse)
 async def research_topic(request: ResearchRequest):
     """
@@ -38,18 +198,226 @@ async def research_topic(request: ResearchRequest):
     """
     try:
         # Run the agent on the research topic
-        result = await research_agent.run(
-            {"topic": request.topic, "max_results": request.max_results}
-        )
+        result = await run_research(request.inputs())
         
-        return ResearchResponse(
-            summary=result["summary"],
-            subtopics=result["subtopics"],
-            search_results=result["search_results"],
-            critique=result.get("critique")
-        )
+        return to_research_response(result)
+    except ResearchRunError as e:
+        # The run can be resumed by its id
+        raise HTTPException(status_code=500, detail={"message": str(e), "run_id": e.run_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/research/{run_id}/resume", response_model=ResearchResponse)
+async def resume_research(run_id: str):
+    """
+    Resume a failed research run from its last completed node
+    """
+    try:
+        # Concurrent resumes of the same run share one execution
+        result = await research_flights.do(("resume", run_id), lambda: research_agent.resume(run_id))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ResearchRunError as e:
+        raise HTTPException(status_code=500, detail={"message": str(e), "run_id": e.run_id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return to_research_response(result)
+
+@app.post("/api/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_research_job(request: ResearchRequest):
+    """
+    Queue a research request and return its job id immediately
+    """
+    try:
+        job = job_manager.submit(request.inputs())
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": str(e),
+                "queue_depth": e.queue_depth,
+                "queue_capacity": e.queue_capacity
+            },
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return JobSubmitResponse(job_id=job.id, status=job.status, queue_depth=job_manager.queue_depth)
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_research_job(job_id: str):
+    """
+    Return the status of a queued research job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(
+        job_id=job.id,
+        status=job.status,
+        queue_position=job_manager.queue_position(job),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error
+    )
+
+@app.get("/api/jobs/{job_id}/result", response_model=ResearchResponse)
+async def get_research_job_result(job_id: str):
+    """
+    Return the result of a completed research job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if not job.done:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return to_research_response(job.result)
+
+# Seconds between SSE keep-alive comments while a node is still running
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format a single Server-Sent Events message
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def sse_stream(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    Relay agent events as SSE messages, sending keep-alive comments while idle
+    
+    Errors are reported as a final "error" event. If the client disconnects,
+    the underlying run is cancelled.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put({"event": "error", "data": {"detail": str(e), "run_id": getattr(e, "run_id", None)}})
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            yield format_sse(event["event"], event["data"])
+    finally:
+        task.cancel()
+
+def sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Wrap an agent event stream in an SSE response
+    """
+    return StreamingResponse(
+        sse_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/research/stream")
+async def research_topic_stream(request: ResearchRequest):
+    """
+    Process a research request, streaming per-node progress as Server-Sent Events
+    """
+    return sse_response(
+        research_agent.stream(request.inputs())
+    )
+
+@app.get("/api/research/stream")
+async def research_topic_stream_get(
+    topic: str,
+    max_results: int = 5,
+    max_iterations: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    char_budget: Optional[int] = None
+):
+    """
+    EventSource-friendly variant of the streaming endpoint
+    """
+    return sse_response(
+        research_agent.stream({
+            "topic": topic,
+            "max_results": max_results,
+            "max_iterations": max_iterations,
+            "time_budget": time_budget,
+            "char_budget": char_budget
+        })
+    )
+
+# Limits for batch research requests
+BATCH_MAX_TOPICS = int(os.getenv("BATCH_MAX_TOPICS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+@app.post("/api/research/batch")
+async def research_batch(request: BatchResearchRequest):
+    """
+    Research many topics under one global concurrency limit, streaming each
+    topic's result as a Server-Sent Event as soon as it completes
+    """
+    if not request.topics:
+        raise HTTPException(status_code=400, detail="No topics given")
+    if len(request.topics) > BATCH_MAX_TOPICS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_TOPICS} topics can be researched in one batch"
+        )
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    return sse_response(
+        research_agent.run_batch(
+            [
+                {"topic": topic, "max_results": request.max_results, **request.budget_inputs()}
+                for topic in request.topics
+            ],
+            concurrency=concurrency
+        )
+    )
+
+JOB_QUEUE_DEPTH = metrics.gauge("research_job_queue_depth", "Research jobs waiting for a worker")
+LLM_CONCURRENCY_LIMIT = metrics.gauge("llm_concurrency_limit", "Current adaptive LLM concurrency limit")
+LLM_CACHE_EVENTS = metrics.gauge("llm_cache_events", "LLM response cache counters", ["event"])
+COALESCED_REQUESTS = metrics.gauge("research_requests_coalesced", "Requests that joined an in-flight identical run")
+MODEL_P95_LATENCY = metrics.gauge("llm_model_p95_latency_seconds", "Rolling p95 LLM latency per tool and model", ["tool", "model"])
+MODEL_ERROR_RATE = metrics.gauge("llm_model_error_rate", "Rolling LLM error rate per tool and model", ["tool", "model"])
+MODEL_HEALTHY = metrics.gauge("llm_model_healthy", "Whether a model currently meets its tool's latency SLO and error limit", ["tool", "model"])
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text-format metrics
+    """
+    JOB_QUEUE_DEPTH.set(job_manager.queue_depth)
+    LLM_CONCURRENCY_LIMIT.set(llm_governor.stats()["concurrency_limit"])
+    COALESCED_REQUESTS.set(research_flights.coalesced)
+    if llm_cache is not None:
+        for event, value in llm_cache.stats().items():
+            LLM_CACHE_EVENTS.set(value, event=event)
+    for (tool, model), stats in model_router.stats().items():
+        MODEL_P95_LATENCY.set(stats["p95_latency"], tool=tool, model=model)
+        MODEL_ERROR_RATE.set(stats["error_rate"], tool=tool, model=model)
+        MODEL_HEALTHY.set(1 if stats["healthy"] else 0, tool=tool, model=model)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/search-index/compact")
+async def compact_search_index():
+    """
+    Expire old entries from the local search index and compact it
+    """
+    index = research_agent.search_tool.index
+    if index is None:
+        raise HTTPException(status_code=404, detail="Local search index is disabled")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, index.compact)
 
 @app.get("/api/health")
 async def health_check():
@@ -59,5 +427,6 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
+    import uvicorn
     
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Model chain per tool: the first model is preferred, the rest are fallbacks.
+# Cheap, fast models for the small structured calls, a stronger model for summaries
+DEFAULT_ROUTES: Dict[str, List[str]] = {
+    "TopicBreakdownTool": ["gemini-1.5-flash", "gemini-2.0-flash"],
+    "query_expansion_tool": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+    "critique_tool": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+    "summarizer_tool": ["gemini-2.5-flash", "gemini-2.0-flash"]
+}
+DEFAULT_CHAIN = ["gemini-2.0-flash", "gemini-2.0-flash-lite"]
+# p95 latency objective per tool, in seconds
+DEFAULT_LATENCY_SLOS: Dict[str, float] = {"summarizer_tool": 20.0}
+
+
+class ModelStats:
+    """
+    Latency and outcome of the recent calls to one model, over a sliding time window
+    """
+
+    def __init__(self, window: float, max_samples: int = 200):
+        self.window = window
+        self._samples: "deque[Tuple[float, float, bool]]" = deque(maxlen=max_samples)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._samples.append((time.time(), latency, ok))
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def summary(self) -> Dict[str, float]:
+        """Sample count, error rate and p95 latency of successful calls in the window"""
+        self._prune()
+        latencies = sorted(latency for _, latency, ok in self._samples if ok)
+        errors = sum(1 for _, _, ok in self._samples if not ok)
+        count = len(self._samples)
+        p95 = latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)] if latencies else 0.0
+        return {
+            "samples": count,
+            "error_rate": errors / count if count else 0.0,
+            "p95_latency": p95
+        }
+
+
+class RoutedCall:
+    """
+    Model selection across the attempts (retries) of one LLM call
+
+    A pinned model is used for every attempt. Otherwise a model that failed
+    during this call is avoided on the next attempt, so retries fail over.
+    """
+
+    def __init__(self, router: "ModelRouter", tool_name: str, model_name: Optional[str] = None):
+        self.router = router
+        self.tool_name = tool_name
+        self.pinned = model_name is not None
+        self.model = model_name or router.choose(tool_name)
+        self._failed: List[str] = []
+        self._start = 0.0
+
+    def begin(self) -> str:
+        """Pick the model for the next attempt"""
+        if self._failed and not self.pinned:
+            self.model = self.router.choose(self.tool_name, exclude=self._failed)
+        self._start = time.perf_counter()
+        return self.model
+
+    @property
+    def route(self) -> str:
+        """How the current model was picked: pinned, primary or fallback"""
+        if self.pinned:
+            return "pinned"
+        return "primary" if self.model == self.router.chain(self.tool_name)[0] else "fallback"
+
+    @property
+    def cache_key(self) -> str:
+        """Model name responses are cached under: the pinned model, else the tool's preferred model"""
+        return self.model if self.pinned else self.router.chain(self.tool_name)[0]
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """Time allowed for one attempt, or None for no limit"""
+        return self.router.attempt_timeout(self.tool_name)
+
+    def has_fallback(self) -> bool:
+        """Whether another model is left to try after the current one failed"""
+        if self.pinned:
+            return False
+        return any(model not in self._failed for model in self.router.chain(self.tool_name))
+
+    def succeeded(self) -> None:
+        self.router.record(self.tool_name, self.model, time.perf_counter() - self._start, ok=True)
+
+    def failed(self) -> None:
+        """Record a failure that counts against the model (throttling, server error, timeout)"""
+        self.router.record(self.tool_name, self.model, time.perf_counter() - self._start, ok=False)
+        self._failed.append(self.model)
+
+
+class ModelRouter:
+    """
+    Per-tool model routing with latency- and error-based failover
+
+    Each tool has a chain of models. Calls go to the first model in the chain
+    that is healthy: over the last `window` seconds, its p95 latency for that
+    tool is within the tool's latency SLO and its error rate is at most
+    `max_error_rate`. Models with fewer than `min_samples` recent calls count
+    as healthy, so a degraded model is retried once its samples age out. If
+    no model is healthy, the one with the lowest error rate, then latency,
+    is used. An attempt that runs longer than `timeout_factor` times the
+    tool's latency SLO is abandoned and counts as a failure.
+    """
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, List[str]]] = None,
+        default_chain: Optional[List[str]] = None,
+        latency_slo: float = 8.0,
+        tool_latency_slos: Optional[Dict[str, float]] = None,
+        max_error_rate: float = 0.2,
+        window: float = 60.0,
+        min_samples: int = 3,
+        timeout_factor: float = 2.0
+    ):
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.default_chain = list(default_chain or DEFAULT_CHAIN)
+        self.latency_slo = latency_slo
+        self.tool_latency_slos = dict(DEFAULT_LATENCY_SLOS if tool_latency_slos is None else tool_latency_slos)
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = max(1, min_samples)
+        self.timeout_factor = timeout_factor
+        self._stats: Dict[Tuple[str, str], ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def chain(self, tool_name: str) -> List[str]:
+        """The models configured for a tool, preferred first"""
+        return self.routes.get(tool_name) or self.default_chain
+
+    def models(self) -> List[str]:
+        """Every model that any route can choose"""
+        names = list(self.default_chain)
+        for chain in self.routes.values():
+            names.extend(chain)
+        return list(dict.fromkeys(names))
+
+    def slo(self, tool_name: str) -> float:
+        return self.tool_latency_slos.get(tool_name, self.latency_slo)
+
+    def attempt_timeout(self, tool_name: str) -> Optional[float]:
+        """Per-attempt timeout for a tool's calls; None when timeout_factor is 0"""
+        if self.timeout_factor <= 0:
+            return None
+        return self.slo(tool_name) * self.timeout_factor
+
+    def _summary(self, tool_name: str, model_name: str) -> Dict[str, float]:
+        with self._lock:
+            stats = self._stats.get((tool_name, model_name))
+            return stats.summary() if stats is not None else {"samples": 0, "error_rate": 0.0, "p95_latency": 0.0}
+
+    def healthy(self, tool_name: str, model_name: str) -> bool:
+        summary = self._summary(tool_name, model_name)
+        if summary["samples"] < self.min_samples:
+            return True
+        return summary["p95_latency"] <= self.slo(tool_name) and summary["error_rate"] <= self.max_error_rate
+
+    def choose(self, tool_name: str, exclude: Iterable[str] = ()) -> str:
+        """
+        Pick the model for a call from `tool_name`
+
+        Args:
+            tool_name: The calling tool
+            exclude: Models to avoid unless nothing else is configured
+
+        Returns:
+            The model name
+        """
+        excluded = set(exclude)
+        chain = self.chain(tool_name)
+        candidates = [model for model in chain if model not in excluded] or chain
+        for model in candidates:
+            if self.healthy(tool_name, model):
+                return model
+        # Everything is degraded: take the least bad model
+        return min(
+            candidates,
+            key=lambda model: (
+                self._summary(tool_name, model)["error_rate"],
+                self._summary(tool_name, model)["p95_latency"]
+            )
+        )
+
+    def start(self, tool_name: str, model_name: Optional[str] = None) -> RoutedCall:
+        """Begin routing one call; model_name pins the model"""
+        return RoutedCall(self, tool_name, model_name)
+
+    def record(self, tool_name: str, model_name: str, latency: float, ok: bool) -> None:
+        """Record the outcome of one provider call"""
+        with self._lock:
+            stats = self._stats.get((tool_name, model_name))
+            if stats is None:
+                stats = self._stats[(tool_name, model_name)] = ModelStats(self.window)
+            stats.record(latency, ok)
+
+    def stats(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Rolling statistics per (tool, model), including whether the model is healthy"""
+        with self._lock:
+            keys = list(self._stats)
+        return {
+            key: dict(self._summary(*key), healthy=self.healthy(*key))
+            for key in keys
+        }
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Build a router from MODEL_ROUTES and MODEL_LATENCY_SLOS (JSON objects
+        keyed by tool name), MODEL_DEFAULT_CHAIN (comma-separated),
+        MODEL_LATENCY_SLO, MODEL_MAX_ERROR_RATE, MODEL_STATS_WINDOW,
+        MODEL_MIN_SAMPLES and MODEL_TIMEOUT_FACTOR
+        """
+        routes = dict(DEFAULT_ROUTES)
+        routes.update(_json_env("MODEL_ROUTES"))
+        tool_latency_slos = dict(DEFAULT_LATENCY_SLOS)
+        tool_latency_slos.update({
+            tool: float(slo) for tool, slo in _json_env("MODEL_LATENCY_SLOS").items()
+        })
+        default_chain = [
+            name.strip() for name in os.getenv("MODEL_DEFAULT_CHAIN", "").split(",") if name.strip()
+        ]
+        return cls(
+            routes=routes,
+            default_chain=default_chain or None,
+            latency_slo=float(os.getenv("MODEL_LATENCY_SLO", "8")),
+            tool_latency_slos=tool_latency_slos,
+            max_error_rate=float(os.getenv("MODEL_MAX_ERROR_RATE", "0.2")),
+            window=float(os.getenv("MODEL_STATS_WINDOW", "60")),
+            min_samples=int(os.getenv("MODEL_MIN_SAMPLES", "3")),
+            timeout_factor=float(os.getenv("MODEL_TIMEOUT_FACTOR", "2"))
+        )
+
+
+def _json_env(name: str) -> Dict[str, Any]:
+    value = os.getenv(name)
+    if not value:
+        return {}
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError as e:
+        print(f"WARNING: ignoring invalid {name}: {e}")
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
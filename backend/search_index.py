@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils import result_key, tokenize
+
+
+class SearchIndex:
+    """
+    Local full-text index of previously retrieved search results
+
+    Results are stored in SQLite and indexed with FTS5; lookups are ranked
+    with FTS5's built-in BM25. Each result is stored once per normalized URL,
+    and re-retrieving it refreshes its content and timestamp. If the SQLite
+    build lacks FTS5 the index disables itself.
+    """
+
+    def __init__(self, path: str, max_age: Optional[float] = None):
+        self.path = path
+        # Results older than max_age seconds are ignored by search() and removed by expire()
+        self.max_age = max_age
+        self.available = True
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> Optional[sqlite3.Connection]:
+        """Open the index on first use; returns None if FTS5 is unavailable"""
+        if self._conn is not None or not self.available:
+            return self._conn
+        with self._lock:
+            if self._conn is None and self.available:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                try:
+                    conn.executescript(
+                        """
+                        PRAGMA journal_mode=WAL;
+                        CREATE TABLE IF NOT EXISTS results (
+                            id INTEGER PRIMARY KEY,
+                            url_key TEXT NOT NULL UNIQUE,
+                            url TEXT,
+                            title TEXT,
+                            snippet TEXT,
+                            query TEXT,
+                            created_at REAL NOT NULL
+                        );
+                        CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at);
+                        CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+                            title, snippet, content='results', content_rowid='id',
+                            tokenize='porter unicode61'
+                        );
+                        CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+                            INSERT INTO results_fts(rowid, title, snippet)
+                            VALUES (new.id, new.title, new.snippet);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+                            INSERT INTO results_fts(results_fts, rowid, title, snippet)
+                            VALUES ('delete', old.id, old.title, old.snippet);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE ON results BEGIN
+                            INSERT INTO results_fts(results_fts, rowid, title, snippet)
+                            VALUES ('delete', old.id, old.title, old.snippet);
+                            INSERT INTO results_fts(rowid, title, snippet)
+                            VALUES (new.id, new.title, new.snippet);
+                        END;
+                        """
+                    )
+                except sqlite3.OperationalError as e:
+                    print(f"WARNING: SQLite FTS5 unavailable, local search index disabled: {e}")
+                    conn.close()
+                    self.available = False
+                    return None
+                self._conn = conn
+        return self._conn
+
+    def add(self, results: List[Dict[str, Any]], query: str = "") -> int:
+        """
+        Insert or refresh results in the index
+
+        Returns:
+            The number of results written
+        """
+        conn = self.open()
+        if conn is None:
+            return 0
+        now = time.time()
+        rows = [
+            (result_key(result), result.get("url", ""), result.get("title", ""),
+             result.get("snippet", ""), query, now)
+            for result in results
+            if result_key(result)
+        ]
+        with self._lock:
+            conn.executemany(
+                """
+                INSERT INTO results (url_key, url, title, snippet, query, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_key) DO UPDATE SET
+                    url = excluded.url, title = excluded.title, snippet = excluded.snippet,
+                    query = excluded.query, created_at = excluded.created_at
+                """,
+                rows
+            )
+            conn.commit()
+        return len(rows)
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return indexed results matching any query term, best BM25 match first
+
+        Each result carries "coverage", the fraction of distinct query terms
+        that appear in its title or snippet.
+        """
+        conn = self.open()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if conn is None or not terms or limit <= 0:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        cutoff = time.time() - self.max_age if self.max_age else 0
+        with self._lock:
+            rows = conn.execute(
+                """
+                SELECT r.url, r.title, r.snippet, bm25(results_fts) AS score
+                FROM results_fts JOIN results r ON r.id = results_fts.rowid
+                WHERE results_fts MATCH ? AND r.created_at >= ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (match, cutoff, limit)
+            ).fetchall()
+        results = []
+        for url, title, snippet, score in rows:
+            document_terms = set(tokenize(f"{title} {snippet}"))
+            results.append({
+                "title": title,
+                "snippet": snippet,
+                "url": url,
+                "score": -score,
+                "coverage": sum(1 for term in terms if term in document_terms) / len(terms)
+            })
+        return results
+
+    def expire(self, max_age: Optional[float] = None) -> int:
+        """
+        Delete results older than max_age seconds (defaults to the index max_age)
+
+        Returns:
+            The number of results removed
+        """
+        max_age = max_age if max_age is not None else self.max_age
+        conn = self.open()
+        if conn is None or not max_age:
+            return 0
+        with self._lock:
+            cursor = conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - max_age,))
+            conn.commit()
+        return cursor.rowcount
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Expire old results, merge the FTS segments and reclaim free pages
+        """
+        expired = self.expire()
+        conn = self.open()
+        if conn is None:
+            return {"expired": 0, "entries": 0}
+        with self._lock:
+            conn.execute("INSERT INTO results_fts(results_fts) VALUES ('optimize')")
+            conn.commit()
+            conn.execute("VACUUM")
+            entries = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"expired": expired, "entries": entries}
+
+    def __len__(self) -> int:
+        conn = self.open()
+        if conn is None:
+            return 0
+        with self._lock:
+            return conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
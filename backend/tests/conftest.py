@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Modules import each other as top-level modules from the backend directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Keep tests off the on-disk LLM cache and search index
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("SEARCH_INDEX_PATH", "")
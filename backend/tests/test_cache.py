@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+from cache import LLMResponseCache, SQLiteCache
+
+
+def test_disk_tier_is_used_off_the_event_loop(tmp_path, monkeypatch):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    threads = []
+    for name in ("get", "set"):
+        original = getattr(cache.disk, name)
+
+        def record(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache.disk, name, record)
+
+    async def main():
+        assert await cache.get_async("model", "prompt") is None
+        await cache.set_async("model", "prompt", "response")
+        cache.memory.clear()
+        assert await cache.get_async("model", "prompt") == "response"
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(main())
+    assert len(threads) == 3
+    assert loop_thread not in threads
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_reads_buffer_access_times_until_the_next_write(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("a", "1")
+    conn = cache.open()
+    written = conn.execute("SELECT accessed_at FROM cache WHERE key = 'a'").fetchone()[0]
+    time.sleep(0.01)
+    assert cache.get("a")[0] == "1"
+    assert not conn.in_transaction
+    assert conn.execute("SELECT accessed_at FROM cache WHERE key = 'a'").fetchone()[0] == written
+    cache.set("b", "2")
+    assert conn.execute("SELECT accessed_at FROM cache WHERE key = 'a'").fetchone()[0] > written
+
+
+def test_eviction_keeps_the_most_recently_accessed_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=2, evict_every=1)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
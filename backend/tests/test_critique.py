@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from agent.tools import critique
+from agent.tools.critique import FALLBACK_CRITIQUE, CritiqueTool
+from utils import ERROR_RESPONSE_PREFIX
+
+
+def run_critique(monkeypatch, response):
+    async def fake_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        return response
+
+    monkeypatch.setattr(critique, "generate_gemini_response", fake_generate)
+    return asyncio.run(CritiqueTool()(topic="ai ethics", summary="A summary.", search_results=[]))
+
+
+def test_failed_call_raises(monkeypatch):
+    with pytest.raises(RuntimeError):
+        run_critique(monkeypatch, f"{ERROR_RESPONSE_PREFIX}: 503 unavailable")
+
+
+def test_unparseable_response_returns_fallback(monkeypatch):
+    assert run_critique(monkeypatch, "not json")["critique"] == FALLBACK_CRITIQUE
+
+
+def test_parses_json_response(monkeypatch):
+    result = run_critique(monkeypatch, '```json\n{"critique": "Thin on sources.", "needs_refinement": true}\n```')
+    assert result["critique"] == "Thin on sources."
+    assert result["refinement_queries"] == ["ai ethics latest research", "ai ethics critiques"]
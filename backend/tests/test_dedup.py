@@ -0,0 +1,27 @@
+import asyncio
+import hashlib
+
+from agent.tools.dedup import DedupTool
+
+SNIPPET = (
+    "Researchers published new guidelines on the ethics of artificial intelligence, "
+    "covering transparency, accountability and the fair use of training data in public services."
+)
+
+
+def test_near_duplicates_are_merged():
+    results = [
+        {"title": "AI ethics guidelines published", "snippet": SNIPPET, "url": "https://a.example.com/story"},
+        {"title": "AI ethics guidelines published", "snippet": SNIPPET + " Syndicated.", "url": "https://b.example.com/copy"},
+        {"title": "Solar panel prices fall", "snippet": "Module prices dropped again this quarter as supply grew.", "url": "https://c.example.com/solar"}
+    ]
+    deduplicated = asyncio.run(DedupTool()(results))
+    assert [result["url"] for result in deduplicated] == ["https://a.example.com/story", "https://c.example.com/solar"]
+    assert deduplicated[0]["extra_sources"] == ["https://b.example.com/copy"]
+
+
+def test_simhash_counts_more_than_65535_shingles():
+    # Every shingle is the same word, so the fingerprint is that word's hash
+    tool = DedupTool(shingle_size=1)
+    expected = int.from_bytes(hashlib.blake2b(b"word", digest_size=8).digest(), "big")
+    assert tool.simhash(" ".join(["word"] * 66000)) == expected
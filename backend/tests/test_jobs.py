@@ -0,0 +1,29 @@
+import asyncio
+
+from jobs import JobManager
+
+
+def test_queue_position_follows_submission_order():
+    release = asyncio.Event()
+
+    async def runner(inputs):
+        await release.wait()
+        return {"topic": inputs["topic"]}
+
+    async def main():
+        manager = JobManager(runner, workers=1, max_queue=10)
+        await manager.start()
+        try:
+            jobs = [manager.submit({"topic": f"topic {i}"}) for i in range(3)]
+            await asyncio.sleep(0)
+            # The first job is running, the others wait in order
+            assert [manager.queue_position(job) for job in jobs] == [None, 1, 2]
+            release.set()
+            while not all(job.done for job in jobs):
+                await asyncio.sleep(0.01)
+            assert [manager.queue_position(job) for job in jobs] == [None, None, None]
+            assert [job.result["topic"] for job in jobs] == ["topic 0", "topic 1", "topic 2"]
+        finally:
+            await manager.stop()
+
+    asyncio.run(main())
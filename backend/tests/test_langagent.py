@@ -0,0 +1,174 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import budget
+
+from agent.langagent import ResearchAgentGraph, ResearchRunError
+from agent.tools.critique import FALLBACK_CRITIQUE
+from agent.tools.search import SearchTool
+from topic_cache import TopicCache
+from utils import ERROR_RESPONSE_PREFIX
+
+
+def test_expand_one_falls_back_to_subtopic_on_failed_response():
+    agent = ResearchAgentGraph()
+
+    async def failing_expansion(query):
+        return f"{ERROR_RESPONSE_PREFIX}: 429 Resource exhausted"
+
+    agent.query_expansion_tool = failing_expansion
+    assert asyncio.run(agent._expand_one("ai ethics history")) == "ai ethics history"
+
+
+def test_failed_summary_update_keeps_previous_summary():
+    agent = ResearchAgentGraph()
+
+    async def failing_update(**kwargs):
+        return f"{ERROR_RESPONSE_PREFIX}: 503 unavailable"
+
+    agent.summarizer_tool.update = failing_update
+    state = {
+        "topic": "ai ethics",
+        "summary": "An earlier summary.",
+        "new_results": [{"title": "New", "snippet": "New finding", "url": "https://example.com"}],
+        "subtopics": [],
+        "budget": None
+    }
+    state = asyncio.run(agent._run_summarize(state))
+    assert state["summary"] == "An earlier summary."
+
+
+def cache_run(agent, topic, max_results):
+    agent.topic_cache.put(topic, max_results, {
+        "result": {
+            "topic": topic,
+            "subtopics": ["ai ethics history"],
+            "search_results": [{"title": "Old", "snippet": "Old finding", "url": "https://example.com/old"}],
+            "summary": "Cached summary.",
+            "critique": "Cached critique."
+        },
+        "expanded_queries": ["ai ethics history timeline"],
+        "searched_queries": ["ai ethics history timeline"]
+    })
+
+
+class FakeSearchTool:
+    normalize_query = staticmethod(SearchTool.normalize_query)
+
+    def __init__(self):
+        self.searches = []
+
+    async def __call__(self, query, max_results=5, use_cache=True):
+        self.searches.append((query, max_results))
+        return [
+            {"title": f"New {i}", "snippet": "New finding", "url": f"https://example.com/{i}"}
+            for i in range(max_results)
+        ]
+
+
+def test_topic_cache_hit_with_fewer_results_searches_again_at_requested_size():
+    agent = ResearchAgentGraph(topic_cache=TopicCache())
+    cache_run(agent, "ai ethics", max_results=3)
+    agent.search_tool = FakeSearchTool()
+
+    state = agent._initial_state({"topic": "ai ethics", "max_results": 10})
+    assert agent._check_topic_cache(state) is None
+    assert state["subtopics"] == ["ai ethics history"]
+    assert state["expanded_queries"] == ["ai ethics history timeline"]
+    assert state["search_results"] == []
+
+    state = asyncio.run(agent._run_search(state))
+    assert agent.search_tool.searches == [("ai ethics history timeline", 10)]
+    assert len(state["search_results"]) == 10
+
+
+def test_topic_cache_seed_with_enough_results_reuses_them():
+    agent = ResearchAgentGraph(topic_cache=TopicCache(), topic_cache_threshold=1.1)
+    cache_run(agent, "ai ethics", max_results=10)
+
+    state = agent._initial_state({"topic": "ai ethics", "max_results": 5})
+    assert agent._check_topic_cache(state) is None
+    assert state["searched_queries"] == ["ai ethics history timeline"]
+    assert state["search_results"][0]["title"] == "Old"
+
+
+def test_run_with_fallback_critique_is_not_cached():
+    agent = ResearchAgentGraph(topic_cache=TopicCache())
+    state = {
+        "topic": "ai ethics",
+        "max_results": 5,
+        "subtopics": [],
+        "search_results": [],
+        "summary": "A summary.",
+        "critique": FALLBACK_CRITIQUE
+    }
+    agent._store_topic(state)
+    assert len(agent.topic_cache) == 0
+    state["critique"] = "Thin on sources."
+    agent._store_topic(state)
+    assert len(agent.topic_cache) == 1
+
+
+def stub_llm(monkeypatch, critique_response):
+    from agent.tools import critique, query_expansion, summarizer, topic_breakdown
+
+    async def fake_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        if tool_name == "critique_tool":
+            return critique_response
+        if "JSON ARRAY" in prompt:
+            return '["ai ethics history"]'
+        return "Generated text."
+
+    for module in (critique, query_expansion, summarizer, topic_breakdown):
+        for name in ("generate_gemini_response", "generate_gemini_response_stream"):
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, fake_generate)
+
+
+def test_failed_runs_are_resumable_until_pruned(monkeypatch, tmp_path):
+    stub_llm(monkeypatch, f"{ERROR_RESPONSE_PREFIX}: 503 unavailable")
+    agent = ResearchAgentGraph(topic_cache=TopicCache())
+    agent.search_tool = FakeSearchTool()
+
+    async def main():
+        await agent.open_checkpointer(str(tmp_path / "checkpoints.sqlite3"))
+        try:
+            with pytest.raises(ResearchRunError) as failure:
+                await agent.run({"topic": "ai ethics", "run_id": "run-1"})
+            assert failure.value.run_id == "run-1"
+            assert len(agent.topic_cache) == 0
+            assert await agent.prune_checkpoints(max_age=3600) == 0
+            assert await agent.prune_checkpoints(max_age=1e-6) == 1
+            with pytest.raises(LookupError):
+                await agent.resume("run-1")
+        finally:
+            await agent.close_checkpointer()
+
+    asyncio.run(main())
+
+
+def test_resumed_run_only_counts_time_spent_before_it_failed(monkeypatch, tmp_path):
+    stub_llm(monkeypatch, f"{ERROR_RESPONSE_PREFIX}: 503 unavailable")
+    agent = ResearchAgentGraph(topic_cache=TopicCache())
+    agent.search_tool = FakeSearchTool()
+
+    later = time.time() + 3600
+
+    async def main():
+        await agent.open_checkpointer(str(tmp_path / "checkpoints.sqlite3"))
+        try:
+            with pytest.raises(ResearchRunError):
+                await agent.run({"topic": "ai ethics", "run_id": "run-1", "time_budget": 60})
+            # Resume as if the service restarted an hour later
+            stub_llm(monkeypatch, '{"critique": "Thin on sources.", "needs_refinement": false}')
+            monkeypatch.setattr(budget, "time", SimpleNamespace(time=lambda: later))
+            return await agent.resume("run-1")
+        finally:
+            await agent.close_checkpointer()
+
+    result = asyncio.run(main())
+    assert result["critique"] == "Thin on sources."
+    assert result["budget"]["deadline"] - later > 50
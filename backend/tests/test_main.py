@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+import main
+from agent.langagent import ResearchRunError
+
+
+def test_failed_run_reports_its_run_id(monkeypatch):
+    async def failing_run(inputs):
+        raise ResearchRunError("run-1", RuntimeError("Critique call failed"))
+
+    monkeypatch.setattr(main.research_agent, "run", failing_run)
+    response = TestClient(main.app).post("/api/research", json={"topic": "ai ethics"})
+    assert response.status_code == 500
+    assert response.json()["detail"]["run_id"] == "run-1"
+    assert "Critique call failed" in response.json()["detail"]["message"]
+
+
+def in_flight(endpoint):
+    prefix = f'api_requests_in_flight{{endpoint="{endpoint}"}} '
+    for line in main.metrics.registry.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0.0
+
+
+def test_streaming_request_is_in_flight_until_its_body_ends(monkeypatch):
+    seen = []
+
+    async def stream(inputs):
+        seen.append(in_flight("/api/research/stream"))
+        yield {"event": "summary", "data": {"summary": "done"}}
+        seen.append(in_flight("/api/research/stream"))
+
+    monkeypatch.setattr(main.research_agent, "stream", stream)
+    before = in_flight("/api/research/stream")
+    response = TestClient(main.app).post("/api/research/stream", json={"topic": "ai ethics"})
+
+    assert response.status_code == 200
+    assert seen == [before + 1, before + 1]
+    assert in_flight("/api/research/stream") == before
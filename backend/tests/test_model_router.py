@@ -0,0 +1,81 @@
+import asyncio
+
+import utils
+from cache import LLMResponseCache
+from model_router import ModelRouter
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class InvalidArgument(Exception):
+    code = 400
+
+
+def route_calls(monkeypatch, generate, **router_options):
+    """Route calls through a fresh router and cache, with a stubbed Gemini client"""
+    router = ModelRouter(
+        routes={"critique_tool": ["primary-model", "fallback-model"]},
+        latency_slo=0.05,
+        **router_options
+    )
+    monkeypatch.setattr(utils, "model_router", router)
+    monkeypatch.setattr(utils, "llm_cache", LLMResponseCache(path=""))
+    monkeypatch.setattr(utils.gemini_client, "generate_async", generate)
+    monkeypatch.setattr(utils.llm_governor, "base_delay", 0.0)
+    return router
+
+
+def test_slow_attempt_times_out_and_fails_over(monkeypatch):
+    calls = []
+
+    async def generate(prompt, model_name):
+        calls.append(model_name)
+        if model_name == "primary-model":
+            await asyncio.sleep(1)
+        return f"answer from {model_name}"
+
+    router = route_calls(monkeypatch, generate, timeout_factor=2)
+    response = asyncio.run(utils.generate_gemini_response("prompt", tool_name="critique_tool"))
+
+    assert response == "answer from fallback-model"
+    assert calls == ["primary-model", "fallback-model"]
+    assert router.stats()[("critique_tool", "primary-model")]["error_rate"] == 1.0
+
+
+def test_non_retryable_error_does_not_fail_over(monkeypatch):
+    calls = []
+
+    async def generate(prompt, model_name):
+        calls.append(model_name)
+        raise InvalidArgument("bad request")
+
+    router = route_calls(monkeypatch, generate)
+    response = asyncio.run(utils.generate_gemini_response("prompt", tool_name="critique_tool"))
+
+    assert utils.is_failed_response(response)
+    assert calls == ["primary-model"]
+    # A bad prompt says nothing about the model's health
+    assert router.stats() == {}
+
+
+def test_response_after_failover_is_cached_for_the_tool(monkeypatch):
+    calls = []
+
+    async def generate(prompt, model_name):
+        calls.append(model_name)
+        if model_name == "primary-model":
+            raise ServiceUnavailable("unavailable")
+        return f"answer from {model_name}"
+
+    route_calls(monkeypatch, generate, max_error_rate=1.0)
+
+    async def main():
+        first = await utils.generate_gemini_response("prompt", tool_name="critique_tool")
+        second = await utils.generate_gemini_response("prompt", tool_name="critique_tool")
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == "answer from fallback-model"
+    assert calls.count("fallback-model") == 1
@@ -0,0 +1,31 @@
+import asyncio
+
+from agent.tools import query_expansion
+from agent.tools.query_expansion import QueryExpansionTool
+from utils import ERROR_RESPONSE_PREFIX
+
+
+def test_expand_batch_keeps_original_queries_when_every_call_fails(monkeypatch):
+    async def failing_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        return f"{ERROR_RESPONSE_PREFIX}: 429 Resource exhausted"
+
+    monkeypatch.setattr(query_expansion, "generate_gemini_response", failing_generate)
+
+    queries = ["ai ethics history", "ai ethics regulation"]
+    assert asyncio.run(QueryExpansionTool().expand_batch(queries)) == queries
+
+
+def test_expand_batch_retries_only_invalid_entries(monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        prompts.append(prompt)
+        if "ORIGINAL QUERIES:" in prompt:
+            return '[{"index": 1, "expanded_query": "ai ethics history timeline"}]'
+        return "ai ethics regulation laws"
+
+    monkeypatch.setattr(query_expansion, "generate_gemini_response", fake_generate)
+
+    expanded = asyncio.run(QueryExpansionTool().expand_batch(["ai ethics history", "ai ethics regulation"]))
+    assert expanded == ["ai ethics history timeline", "ai ethics regulation laws"]
+    assert len(prompts) == 2
@@ -0,0 +1,52 @@
+import asyncio
+
+from agent.tools import summarizer
+from agent.tools.summarizer import SummarizerTool
+from utils import ERROR_RESPONSE_PREFIX
+
+
+def make_results(count):
+    return [
+        {"title": f"Result {i}", "snippet": f"Finding number {i} about the topic", "url": f"https://example.com/{i}"}
+        for i in range(count)
+    ]
+
+
+def test_map_reduce_stops_when_every_merge_fails(monkeypatch):
+    calls = {"map": 0, "merge": 0}
+
+    async def fake_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        if "PARTIAL SUMMARY" in prompt:
+            calls["merge"] += 1
+            if calls["merge"] > 50:
+                # Let a looping reduce step finish so the assertions below can fail
+                return "Merged."
+            return f"{ERROR_RESPONSE_PREFIX}: 503 unavailable"
+        calls["map"] += 1
+        return f"Partial finding {calls['map']} [1]."
+
+    monkeypatch.setattr(summarizer, "generate_gemini_response", fake_generate)
+    monkeypatch.setattr(summarizer, "generate_gemini_response_stream", fake_generate)
+
+    tool = SummarizerTool(map_reduce_threshold=1, chunk_size=1, fan_out=2)
+    summary = asyncio.run(tool.map_reduce("topic", make_results(10)))
+
+    assert calls["map"] == 10
+    # One failed round of five merges, then the partial summaries are returned as they are
+    assert calls["merge"] == 5
+    assert summary.count("Partial finding") == 10
+
+
+def test_map_reduce_merges_down_to_one_summary(monkeypatch):
+    async def fake_generate(prompt, model_name=None, use_cache=True, tool_name="unknown"):
+        if "PARTIAL SUMMARY" in prompt:
+            return "Merged [2] and invented [99]. Kept [3][7] and [12]."
+        return "Partial finding [1]."
+
+    monkeypatch.setattr(summarizer, "generate_gemini_response", fake_generate)
+    monkeypatch.setattr(summarizer, "generate_gemini_response_stream", fake_generate)
+
+    tool = SummarizerTool(map_reduce_threshold=1, chunk_size=1, fan_out=2)
+    summary = asyncio.run(tool.map_reduce("topic", make_results(10)))
+
+    assert summary == "Merged [2] and invented. Kept [3][7] and."
@@ -0,0 +1,54 @@
+from topic_cache import TopicCache
+
+# Unrelated topics so that IDF weights resemble a cache in use
+BACKGROUND_TOPICS = ["deep learning basics", "history of rome", "quantum physics", "solar energy policy"]
+
+
+def make_cache(*topics):
+    cache = TopicCache()
+    for topic in BACKGROUND_TOPICS + list(topics):
+        cache.put(topic, 5, {"topic": topic})
+    return cache
+
+
+def test_acronym_paraphrase_is_a_hit():
+    cache = make_cache("ethics of artificial intelligence")
+    result, similarity, _ = cache.lookup("AI ethics")
+    assert result == {"topic": "ethics of artificial intelligence"}
+    assert similarity >= 0.85
+
+
+def test_acronym_matches_in_either_direction():
+    cache = make_cache("AI ethics")
+    _, similarity, _ = cache.lookup("ethics of artificial intelligence")
+    assert similarity >= 0.85
+
+
+def test_reordered_topic_is_a_hit():
+    cache = make_cache("climate change impacts on agriculture")
+    _, similarity, entry = cache.lookup("impacts of climate change on agriculture")
+    assert entry.topic == "climate change impacts on agriculture"
+    assert similarity >= 0.85
+
+
+def test_different_topics_do_not_match():
+    cache = make_cache("ethics of artificial intelligence", "climate change impacts on agriculture")
+    assert cache.lookup("AI safety", min_similarity=0.75) is None
+    assert cache.lookup("climate change impacts on fisheries", min_similarity=0.75) is None
+
+
+def test_topics_with_different_numbers_do_not_match():
+    cache = make_cache("python 3.12 features")
+    assert cache.lookup("python 3.13 features") is None
+
+
+def test_put_replaces_identical_topic_and_evicts_oldest():
+    cache = TopicCache(max_entries=2)
+    cache.put("ai ethics", 5, {"version": 1})
+    cache.put("ai ethics", 5, {"version": 2})
+    assert len(cache) == 1
+    assert cache.lookup("ai ethics")[0] == {"version": 2}
+    cache.put("quantum computing", 5, {})
+    cache.put("roman empire history", 5, {})
+    assert len(cache) == 2
+    assert cache.lookup("ai ethics", min_similarity=0.5) is None
@@ -0,0 +1,205 @@
+import copy
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from context_packer import STOPWORDS
+from utils import tokenize
+
+
+class TopicCacheEntry:
+    """A cached research result and the topic words it is matched on"""
+
+    def __init__(self, topic: str, max_results: int, result: Dict[str, Any], words: List[str], keys: Set[str], numbers: frozenset):
+        self.topic = topic
+        self.max_results = max_results
+        self.result = result
+        self.words = words
+        self.keys = keys
+        self.numbers = numbers
+        self.created_at = time.time()
+
+
+class TopicCache:
+    """
+    Research result cache that matches paraphrased topics
+
+    Topics are compared by cosine similarity of TF-IDF weighted word and
+    character-trigram features, which ignore word order, so "climate change
+    impacts on agriculture" matches "impacts of climate change on
+    agriculture". Before comparing two topics, an acronym in one that spells
+    the initials of consecutive words in the other is expanded, so "AI ethics"
+    matches "ethics of artificial intelligence". An inverted index from
+    features and initials to entries narrows each lookup to the entries that
+    share at least one of them. Topics that mention different numbers (years,
+    versions) never match.
+    """
+
+    # Acronyms and the word runs they abbreviate are this long
+    ACRONYM_LENGTHS = (2, 3, 4)
+
+    def __init__(self, ttl: Optional[float] = 3600, max_entries: int = 256, ngram_size: int = 3):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.ngram_size = ngram_size
+        self._entries: "OrderedDict[int, TopicCacheEntry]" = OrderedDict()
+        self._postings: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def words(topic: str) -> List[str]:
+        """The words of a topic that carry meaning, in order"""
+        return [token for token in tokenize(topic) if token not in STOPWORDS]
+
+    def features(self, words: List[str]) -> Counter:
+        """Word and character-trigram feature counts"""
+        features = Counter(f"w:{word}" for word in words)
+        for word in words:
+            padded = f" {word} "
+            for i in range(max(1, len(padded) - self.ngram_size + 1)):
+                features[f"c:{padded[i:i + self.ngram_size]}"] += 1
+        return features
+
+    def _keys(self, words: List[str]) -> Set[str]:
+        """
+        Index keys: the features, plus possible acronyms (short words) and the
+        initials of consecutive word runs, so acronym pairs share a key
+        """
+        keys = set(self.features(words))
+        alphabetic = [word for word in words if word.isalpha()]
+        for word in alphabetic:
+            if len(word) in self.ACRONYM_LENGTHS:
+                keys.add(f"i:{word}")
+        for size in self.ACRONYM_LENGTHS:
+            for i in range(len(alphabetic) - size + 1):
+                keys.add(f"i:{''.join(word[0] for word in alphabetic[i:i + size])}")
+        return keys
+
+    def _expand_acronyms(self, words: List[str], other: List[str]) -> List[str]:
+        """
+        Replace each word of `words` that is missing from `other` but spells the
+        initials of consecutive words in `other` with those words
+        """
+        known = set(other)
+        runs: Dict[str, List[str]] = {}
+        for size in self.ACRONYM_LENGTHS:
+            for i in range(len(other) - size + 1):
+                run = other[i:i + size]
+                if all(word.isalpha() for word in run):
+                    runs.setdefault("".join(word[0] for word in run), run)
+        expanded = []
+        for word in words:
+            if word not in known and word in runs:
+                expanded.extend(runs[word])
+            else:
+                expanded.append(word)
+        return expanded
+
+    def _idf(self, feature: str) -> float:
+        total = len(self._entries)
+        return math.log((1 + total) / (1 + len(self._postings.get(feature, ())))) + 1
+
+    def _vector(self, features: Counter) -> Dict[str, float]:
+        """
+        TF-IDF vector in which word and character features are normalized
+        separately, so that each family contributes half of the similarity
+        """
+        vector = {feature: count * self._idf(feature) for feature, count in features.items()}
+        norms: Dict[str, float] = {}
+        for feature, weight in vector.items():
+            norms[feature[0]] = norms.get(feature[0], 0.0) + weight * weight
+        return {
+            feature: weight / math.sqrt(2 * norms[feature[0]])
+            for feature, weight in vector.items()
+        }
+
+    def similarity(self, words: List[str], other: List[str]) -> float:
+        """Cosine similarity of two topics' words after expanding shared acronyms"""
+        query = self._vector(self.features(self._expand_acronyms(words, other)))
+        vector = self._vector(self.features(self._expand_acronyms(other, words)))
+        return sum(weight * vector.get(feature, 0.0) for feature, weight in query.items())
+
+    def lookup(self, topic: str, min_similarity: float = 0.0) -> Optional[Tuple[Dict[str, Any], float, TopicCacheEntry]]:
+        """
+        Find the most similar cached topic
+
+        Returns:
+            (result, similarity, entry) for the best match at or above
+            min_similarity, or None. The result is a deep copy.
+        """
+        words = self.words(topic)
+        if not words:
+            return None
+        numbers = _numbers(words)
+        with self._lock:
+            self._expire()
+            candidates = set()
+            for key in self._keys(words):
+                candidates.update(self._postings.get(key, ()))
+            if not candidates:
+                return None
+            best = None
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.numbers != numbers:
+                    continue
+                similarity = self.similarity(words, entry.words)
+                if similarity >= min_similarity and (best is None or similarity > best[1]):
+                    best = (entry_id, similarity)
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+            entry = self._entries[best[0]]
+            return copy.deepcopy(entry.result), best[1], entry
+
+    def put(self, topic: str, max_results: int, result: Dict[str, Any]) -> None:
+        """Cache the result of a research run, replacing an identical topic"""
+        words = self.words(topic)
+        if not words:
+            return
+        keys = self._keys(words)
+        entry = TopicCacheEntry(topic, max_results, copy.deepcopy(result), words, keys, _numbers(words))
+        with self._lock:
+            for entry_id, existing in list(self._entries.items()):
+                if existing.topic == topic:
+                    self._remove(entry_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for key in keys:
+                self._postings.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in entry.keys:
+            postings = self._postings.get(key)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[key]
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        cutoff = time.time() - self.ttl
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry.created_at < cutoff]
+        for entry_id in expired:
+            self._remove(entry_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _numbers(words: List[str]) -> frozenset:
+    """The numbers (years, versions) mentioned in a topic"""
+    return frozenset(word for word in words if word.isdigit())
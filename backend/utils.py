@@ -1,89 +1,806 @@
 import os
-import google.generativeai as genai
-from typing import Optional
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Any, Callable, Awaitable, AsyncIterator
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote_plus
 import asyncio
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cache import LLMResponseCache
+from model_router import ModelRouter, RoutedCall
+import metrics
 
-# 设置API密钥
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY环境变量未设置")
+# google.generativeai在首次使用时才导入并配置，避免拖慢启动和导入
+_genai = None
+_genai_lock = threading.Lock()
 
-# 配置API
-genai.configure(api_key=GEMINI_API_KEY)
+def get_genai():
+    """
+    返回已配置API密钥的google.generativeai模块（首次调用时导入并配置）
+    
+    Returns:
+        google.generativeai模块
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                # 设置API密钥
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY环境变量未设置")
+                import google.generativeai as genai
+                # 配置API
+                genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
+
+# 响应缓存配置：内存LRU + SQLite持久化存储，按(model_name, prompt)的哈希寻址
+# LLM_CACHE_PATH 设置为空字符串时只使用内存缓存
+# 异步调用中SQLite的读写在线程池中执行，不阻塞事件循环
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite3")
+)
+
+llm_cache = LLMResponseCache(
+    path=LLM_CACHE_PATH or None,
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+    memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024")),
+    disk_entries=int(os.getenv("LLM_CACHE_DISK_ENTRIES", "50000"))
+) if LLM_CACHE_ENABLED else None
+
+# Gemini客户端：每个模型名称复用一个GenerativeModel对象，
+# 优先使用SDK的原生异步接口，否则在专用的、固定大小的线程池中执行同步调用
+class GeminiClient:
+    """
+    Gemini API客户端
+    """
+    
+    def __init__(self, max_workers: int = 32, use_async_sdk: bool = True):
+        self.max_workers = max(1, max_workers)
+        self.use_async_sdk = use_async_sdk
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """专用线程池，首次使用时创建，不与默认线程池共享"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="gemini"
+                    )
+        return self._executor
+    
+    def get_model(self, model_name: str):
+        """获取（并缓存）指定名称的模型对象"""
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    model = get_genai().GenerativeModel(model_name)
+                    self._models[model_name] = model
+        return model
+    
+    def generate(self, prompt: str, model_name: str, timeout: Optional[float] = None) -> str:
+        """同步生成响应文本，出错时抛出异常；timeout为请求超时（秒），超时抛出DeadlineExceeded"""
+        request_options = {"timeout": timeout} if timeout else None
+        response = self.get_model(model_name).generate_content(prompt, request_options=request_options)
+        return response.text
+    
+    async def generate_async(self, prompt: str, model_name: str) -> str:
+        """异步生成响应文本，出错时抛出异常"""
+        model = self.get_model(model_name)
+        if self.use_async_sdk and hasattr(model, "generate_content_async"):
+            response = await model.generate_content_async(prompt)
+            return response.text
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: self.generate(prompt, model_name)
+        )
+    
+    async def generate_stream_async(self, prompt: str, model_name: str, on_chunk: Callable[[str], None]) -> str:
+        """
+        流式生成响应文本：每收到一段文本就调用on_chunk，返回完整文本，出错时抛出异常
+        """
+        model = self.get_model(model_name)
+        parts: List[str] = []
+        if self.use_async_sdk and hasattr(model, "generate_content_async"):
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    on_chunk(text)
+            return "".join(parts)
+        
+        # 同步SDK在专用线程池中迭代，文本片段通过事件循环转交给on_chunk
+        loop = asyncio.get_running_loop()
+        
+        def consume() -> str:
+            for chunk in model.generate_content(prompt, stream=True):
+                text = _chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    loop.call_soon_threadsafe(on_chunk, text)
+            return "".join(parts)
+        
+        return await loop.run_in_executor(self.executor, consume)
+    
+    def shutdown(self) -> None:
+        """关闭专用线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+def _chunk_text(chunk) -> str:
+    """流式响应片段的文本；被安全过滤等原因没有文本的片段返回空字符串"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+gemini_client = GeminiClient(
+    max_workers=int(os.getenv("GEMINI_EXECUTOR_WORKERS", "32")),
+    use_async_sdk=os.getenv("GEMINI_USE_ASYNC_SDK", "1").lower() not in ("0", "false", "no")
+)
+
+# 令牌桶限速器：限制每秒发出的请求数，允许一定的突发
+class TokenBucket:
+    """
+    线程安全的令牌桶，同时支持同步和异步等待
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """取出一个令牌，返回需要等待的秒数（令牌不足时预支）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+    
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def acquire_sync(self) -> None:
+        if self.rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+# AIMD并发控制：成功时加性增加并发上限，被限流时乘性减小
+class AIMDConcurrencyLimiter:
+    """
+    根据限流信号自适应调整并发上限的异步限制器
+    """
+    
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        # 同一波限流只减小一次上限
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+    
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+    
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+    
+    async def release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+    
+    def on_success(self) -> None:
+        """加性增加：每个完整窗口的成功请求使上限增加约1"""
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+    
+    def on_throttle(self) -> None:
+        """乘性减小：收到限流信号时按比例降低上限"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+# 可重试的错误类型（google.api_core.exceptions中的类名）和HTTP状态码
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "GatewayTimeout", "BadGateway"
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+def _error_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    # google.api_core的code可能是属性或枚举
+    code = getattr(code, "value", code)
+    return code if isinstance(code, int) else None
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断错误是否值得重试（限流、服务暂不可用、超时、连接错误）"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES or _error_code(error) in RETRYABLE_STATUS_CODES
+
+def is_throttle_error(error: Exception) -> bool:
+    """判断错误是否为限流（429）"""
+    return type(error).__name__ in THROTTLE_ERROR_NAMES or _error_code(error) == 429
+
+# LLM调用管控：令牌桶限速 + 带抖动的指数退避重试 + AIMD并发控制
+class LLMCallGovernor:
+    """
+    所有LLM调用共享的调用管控器
+    """
+    
+    def __init__(
+        self,
+        rate_limiter: TokenBucket,
+        concurrency: AIMDConcurrencyLimiter,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0
+    ):
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间（full jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if is_throttle_error(error):
+            self.throttled += 1
+            self.concurrency.on_throttle()
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            return False
+        self.retries += 1
+        print(f"Retrying LLM call after error (attempt {attempt + 1}/{self.max_retries}): {error}")
+        return True
+    
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在限速和并发控制下执行异步调用，可重试的错误按退避策略重试
+        
+        Args:
+            func: 每次尝试时调用的无参协程函数
+            
+        Returns:
+            调用结果；重试耗尽或不可重试时抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            await self.concurrency.acquire()
+            try:
+                result = await func()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                await self.concurrency.release()
+            await asyncio.sleep(self.backoff_delay(attempt))
+            attempt += 1
+    
+    def call_sync(self, func: Callable[[], Any]) -> Any:
+        """
+        call()的同步版本：限速和重试相同，但不经过异步并发限制器
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire_sync()
+            try:
+                return func()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            time.sleep(self.backoff_delay(attempt))
+            attempt += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "retries": self.retries,
+            "throttled": self.throttled
+        }
+
+llm_governor = LLMCallGovernor(
+    rate_limiter=TokenBucket(
+        rate=float(os.getenv("LLM_RATE_LIMIT_RPS", "10")),
+        capacity=float(os.getenv("LLM_RATE_LIMIT_BURST", "20"))
+    ),
+    concurrency=AIMDConcurrencyLimiter(
+        initial=int(os.getenv("LLM_CONCURRENCY_INITIAL", "8")),
+        minimum=int(os.getenv("LLM_CONCURRENCY_MIN", "1")),
+        maximum=int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+    ),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+    base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+    max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+)
+
+# 按工具选择模型：每个工具配置一个模型链，首选模型的延迟超出SLO或错误率过高时切换到后备模型
+model_router = ModelRouter.from_env()
+
+async def _call_routed(route: RoutedCall, func: Callable[[str], Awaitable[str]]) -> str:
+    """
+    在调用管控器下执行一次路由的LLM调用：每次尝试都记录所用模型的延迟和结果，
+    失败后的重试换用其他模型；重试耗尽后，若模型链中还有未尝试的模型则继续切换。
+    每次尝试的时长不超过route.timeout，超时算作失败。只有限流、服务端错误和超时
+    计入模型的错误率并触发切换，请求错误、安全拦截等不可重试的错误直接抛出
+    
+    Args:
+        route: 本次调用的模型路由
+        func: 以模型名称为参数的协程函数
+        
+    Returns:
+        生成的响应文本
+    """
+    async def attempt() -> str:
+        model_name = route.begin()
+        timeout = route.timeout
+        try:
+            if timeout is None:
+                text = await func(model_name)
+            else:
+                try:
+                    text = await asyncio.wait_for(func(model_name), timeout)
+                except asyncio.TimeoutError:
+                    raise asyncio.TimeoutError(f"{model_name} did not respond within {timeout:.1f}s")
+        except Exception as e:
+            if is_retryable_error(e):
+                route.failed()
+            raise
+        route.succeeded()
+        return text
+    
+    while True:
+        try:
+            return await llm_governor.call(attempt)
+        except Exception as e:
+            if not is_retryable_error(e) or not route.has_fallback():
+                raise
+            print(f"Model {route.model} failed for {route.tool_name}, failing over: {e}")
+
+def _call_routed_sync(route: RoutedCall, func: Callable[[str], str]) -> str:
+    """
+    _call_routed()的同步版本；同步调用无法被取消，超时由func自行传给SDK
+    """
+    def attempt() -> str:
+        model_name = route.begin()
+        try:
+            text = func(model_name)
+        except Exception as e:
+            if is_retryable_error(e):
+                route.failed()
+            raise
+        route.succeeded()
+        return text
+    
+    while True:
+        try:
+            return llm_governor.call_sync(attempt)
+        except Exception as e:
+            if not is_retryable_error(e) or not route.has_fallback():
+                raise
+            print(f"Model {route.model} failed for {route.tool_name}, failing over: {e}")
+
+# 预热LLM层：在应用启动时完成SDK导入、API配置和缓存打开，而不是在第一个请求中
+def warm_up(model_names: Optional[List[str]] = None) -> None:
+    """
+    预热LLM客户端
+    
+    Args:
+        model_names: 需要预先创建模型对象的模型名称列表，默认为路由中配置的全部模型
+    """
+    get_genai()
+    for model_name in model_router.models() if model_names is None else model_names:
+        gemini_client.get_model(model_name)
+    if llm_cache is not None:
+        llm_cache.open()
+
+# 批量研究时，一个批次内所有LLM和搜索调用共享的并发槽位；不在批次中时为None
+call_slots: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("call_slots", default=None)
+
+@asynccontextmanager
+async def call_slot() -> AsyncIterator[None]:
+    """
+    在当前批次的全局并发槽位内执行一次外部调用；不在批次中时不做限制
+    """
+    semaphore = call_slots.get()
+    if semaphore is None:
+        yield
+        return
+    async with semaphore:
+        yield
+
+class LLMUsage:
+    """
+    累计一段执行过程中实际发送给模型的提示与响应字符数（缓存命中不计入）
+    """
+    
+    def __init__(self):
+        self.calls = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+    
+    def add(self, prompt: str, response: str) -> None:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        self.response_chars += len(response)
+    
+    @property
+    def total_chars(self) -> int:
+        return self.prompt_chars + self.response_chars
+
+# 当前执行上下文的LLM用量累加器，由研究图在每个节点运行时设置；未设置时为None
+llm_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+def track_llm_usage(prompt: str, response: Optional[str]) -> None:
+    usage = llm_usage.get()
+    if usage is not None:
+        usage.add(prompt, response or "")
+
+# 安全过滤器等原因导致没有响应文本时的提示
+EMPTY_RESPONSE_MESSAGE = "无法生成响应。可能是由于安全过滤器触发或其他API问题。"
+# 调用失败时返回的备用响应前缀
+ERROR_RESPONSE_PREFIX = "生成响应时出错"
+
+def is_failed_response(text: str) -> bool:
+    """判断响应是否为空，或为调用失败、安全过滤时返回的备用提示"""
+    return not text or text == EMPTY_RESPONSE_MESSAGE or text.startswith(ERROR_RESPONSE_PREFIX)
 
 # 非异步版本
-def generate_gemini_response_sync(prompt: str, model_name: str = "gemini-2.0-flash") -> str:
+def generate_gemini_response_sync(
+    prompt: str,
+    model_name: Optional[str] = None,
+    use_cache: bool = True,
+    tool_name: str = "unknown"
+) -> str:
     """
     使用Gemini API生成响应（同步版本）
     
     Args:
         prompt: 输入提示
-        model_name: 要使用的模型名称，默认使用gemini-1.5-flash
+        model_name: 要使用的模型名称；默认为None，按tool_name由model_router选择
+        use_cache: 是否读写响应缓存，设置为False时总是请求API
+        tool_name: 调用方工具名称，用于指标统计
         
     Returns:
         生成的响应文本
     """
-    try:
-        # 确保使用有效的模型名称
-        model = genai.GenerativeModel(model_name)
-        
-        # 生成内容
-        response = model.generate_content(prompt)
-        
-        # 提取响应文本
-        if response.text:
-            return response.text
-        else:
-            return "无法生成响应。可能是由于安全过滤器触发或其他API问题。"
+    start = time.perf_counter()
+    metrics.LLM_PROMPT_CHARS.observe(len(prompt), tool=tool_name)
+    route = model_router.start(tool_name, model_name)
+    cache = llm_cache if use_cache else None
+    if cache is not None:
+        cached = cache.get(route.cache_key, prompt)
+        if cached is not None:
+            _record_llm_call(tool_name, route, "cache_hit", start, cached)
+            return cached
     
+    try:
+        with metrics.LLM_IN_FLIGHT.track_inprogress():
+            text = _call_routed_sync(
+                route,
+                lambda model: gemini_client.generate(prompt, model, timeout=route.timeout)
+            )
     except Exception as e:
         print(f"Error generating response: {e}")
+        _record_llm_call(tool_name, route, "error", start)
+        track_llm_usage(prompt, None)
         # 提供一个备用响应
-        return f"生成响应时出错: {str(e)}"
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+    
+    track_llm_usage(prompt, text)
+    if not text:
+        _record_llm_call(tool_name, route, "empty", start)
+        return EMPTY_RESPONSE_MESSAGE
+    # 只缓存成功的响应，错误和安全过滤的提示永远不会进入缓存
+    if cache is not None:
+        cache.set(route.cache_key, prompt, text)
+    _record_llm_call(tool_name, route, "ok", start, text)
+    return text
 
-# 异步包装器
-async def generate_gemini_response(prompt: str, model_name: str = "gemini-2.0-flash") -> str:
+# 异步版本
+async def generate_gemini_response(
+    prompt: str,
+    model_name: Optional[str] = None,
+    use_cache: bool = True,
+    tool_name: str = "unknown"
+) -> str:
     """
     使用Gemini API生成响应（异步版本）
     
     Args:
         prompt: 输入提示
-        model_name: 要使用的模型名称，默认使用gemini-1.5-flash
+        model_name: 要使用的模型名称；默认为None，按tool_name由model_router选择
+        use_cache: 是否读写响应缓存，设置为False时总是请求API
+        tool_name: 调用方工具名称，用于指标统计
         
     Returns:
         生成的响应文本
     """
-    # 使用线程池运行同步函数
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None, 
-        lambda: generate_gemini_response_sync(prompt, model_name)
-    )
-    return response
+    start = time.perf_counter()
+    metrics.LLM_PROMPT_CHARS.observe(len(prompt), tool=tool_name)
+    route = model_router.start(tool_name, model_name)
+    cache = llm_cache if use_cache else None
+    if cache is not None:
+        cached = await cache.get_async(route.cache_key, prompt)
+        if cached is not None:
+            _record_llm_call(tool_name, route, "cache_hit", start, cached)
+            return cached
+    
+    try:
+        async with call_slot():
+            with metrics.LLM_IN_FLIGHT.track_inprogress():
+                text = await _call_routed(route, lambda model: gemini_client.generate_async(prompt, model))
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        _record_llm_call(tool_name, route, "error", start)
+        track_llm_usage(prompt, None)
+        # 提供一个备用响应
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+    
+    track_llm_usage(prompt, text)
+    if not text:
+        _record_llm_call(tool_name, route, "empty", start)
+        return EMPTY_RESPONSE_MESSAGE
+    # 只缓存成功的响应，错误和安全过滤的提示永远不会进入缓存
+    if cache is not None:
+        await cache.set_async(route.cache_key, prompt, text)
+    _record_llm_call(tool_name, route, "ok", start, text)
+    return text
+
+# 流式输出的接收函数，由需要实时转发文本的调用方（如研究流式接口）设置；
+# 收到None表示此前转发的文本作废（请求重试，将重新开始输出）
+token_sink: ContextVar[Optional[Callable[[Optional[str]], None]]] = ContextVar("token_sink", default=None)
+
+# 流式版本
+async def generate_gemini_response_stream(
+    prompt: str,
+    model_name: Optional[str] = None,
+    use_cache: bool = True,
+    tool_name: str = "unknown"
+) -> str:
+    """
+    使用Gemini API流式生成响应：生成的文本片段实时交给当前的token_sink，
+    同时返回拼接好的完整文本。没有设置token_sink时等同于generate_gemini_response
+    
+    Args:
+        prompt: 输入提示
+        model_name: 要使用的模型名称；默认为None，按tool_name由model_router选择
+        use_cache: 是否读写响应缓存；缓存命中时整段文本作为一个片段输出
+        tool_name: 调用方工具名称，用于指标统计
+        
+    Returns:
+        生成的完整响应文本
+    """
+    sink = token_sink.get()
+    if sink is None:
+        return await generate_gemini_response(prompt, model_name, use_cache, tool_name)
+    
+    start = time.perf_counter()
+    metrics.LLM_PROMPT_CHARS.observe(len(prompt), tool=tool_name)
+    route = model_router.start(tool_name, model_name)
+    cache = llm_cache if use_cache else None
+    if cache is not None:
+        cached = await cache.get_async(route.cache_key, prompt)
+        if cached is not None:
+            _record_llm_call(tool_name, route, "cache_hit", start, cached)
+            sink(cached)
+            return cached
+    
+    emitted = False
+    
+    def on_chunk(text: str) -> None:
+        nonlocal emitted
+        if not emitted:
+            metrics.LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start, tool=tool_name)
+            emitted = True
+        sink(text)
+    
+    async def attempt(model: str) -> str:
+        nonlocal emitted
+        # 重试时通知接收方丢弃上一次尝试已输出的片段
+        if emitted:
+            sink(None)
+            emitted = False
+        return await gemini_client.generate_stream_async(prompt, model, on_chunk)
+    
+    try:
+        async with call_slot():
+            with metrics.LLM_IN_FLIGHT.track_inprogress():
+                text = await _call_routed(route, attempt)
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        _record_llm_call(tool_name, route, "error", start)
+        track_llm_usage(prompt, None)
+        if emitted:
+            sink(None)
+        # 提供一个备用响应
+        return f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+    
+    track_llm_usage(prompt, text)
+    if not text:
+        _record_llm_call(tool_name, route, "empty", start)
+        return EMPTY_RESPONSE_MESSAGE
+    if cache is not None:
+        await cache.set_async(route.cache_key, prompt, text)
+    _record_llm_call(tool_name, route, "ok", start, text)
+    return text
+
+# 记录一次LLM调用的指标，包括最终使用的模型及其选择方式
+def _record_llm_call(tool_name: str, route: RoutedCall, outcome: str, start: float, response: Optional[str] = None) -> None:
+    metrics.LLM_LATENCY.observe(time.perf_counter() - start, tool=tool_name, model=route.model, outcome=outcome)
+    metrics.LLM_MODEL_ROUTED.inc(tool=tool_name, model=route.model, route=route.route)
+    if response is not None:
+        metrics.LLM_RESPONSE_CHARS.observe(len(response), tool=tool_name)
 
 # 用于格式化搜索结果的函数
-def format_results_for_llm(results):
+def format_results_for_llm(results, numbers=None):
     """
     将搜索结果格式化为LLM可读的形式
     
     Args:
         results: 搜索结果列表
+        numbers: 可选，每个结果的编号（用于引用原始结果序号），默认从1开始顺序编号
         
     Returns:
         格式化后的字符串
     """
     formatted_text = ""
-    for i, result in enumerate(results, 1):
+    for i, result in zip(numbers or range(1, len(results) + 1), results):
         title = result.get("title", "No title")
         snippet = result.get("snippet", "No snippet")
         url = result.get("url", "No URL")
         
         formatted_text += f"[{i}] {title}\n"
         formatted_text += f"URL: {url}\n"
+        if result.get("extra_sources"):
+            formatted_text += f"Also reported by: {', '.join(result['extra_sources'])}\n"
         formatted_text += f"Description: {snippet}\n\n"
     
     return formatted_text
 
+# 用于分词的正则表达式：匹配英文单词/数字，以及单个中文字符
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+# 用于文本分词的函数
+def tokenize(text: str) -> List[str]:
+    """
+    将文本转换为小写词元列表，用于去重和相关性排序
+    
+    Args:
+        text: 输入文本
+        
+    Returns:
+        词元列表
+    """
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+# 规范化URL时需要去除的跟踪参数
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "ref_src", "spm"}
+
+# 用于规范化URL的函数
+def normalize_url(url: str) -> str:
+    """
+    规范化URL，用于跨查询的结果去重
+    
+    Args:
+        url: 原始URL
+        
+    Returns:
+        规范化后的URL（小写协议和主机、去除www前缀、片段、跟踪参数和末尾斜杠）
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    if scheme == "https":
+        scheme = "http"
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    if netloc.endswith(":80") or netloc.endswith(":443"):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+# 用于计算搜索结果去重键的函数
+def result_key(result: Dict[str, Any]) -> str:
+    """
+    返回搜索结果的去重键（规范化URL，没有URL时使用标题）
+    """
+    return normalize_url(result.get("url", "")) or result.get("title", "")
+
+# 用于合并多个查询搜索结果的函数
+def merge_search_results(merged: Dict[str, Dict[str, Any]], results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """
+    将一个查询的搜索结果按规范化URL合并到结果表中，并记录返回每个结果的查询
+    
+    Args:
+        merged: 以规范化URL为键的结果表（原地更新，保持插入顺序）
+        results: 该查询返回的搜索结果列表
+        query: 产生这些结果的查询
+        
+    Returns:
+        本次新增（之前未出现过）的结果列表
+    """
+    added = []
+    for result in results:
+        key = result_key(result)
+        existing = merged.get(key)
+        if existing is not None:
+            if query not in existing["queries"]:
+                existing["queries"].append(query)
+            continue
+        entry = dict(result)
+        entry["queries"] = [query]
+        merged[key] = entry
+        added.append(entry)
+    return added
+
 # 用于执行网络搜索的函数
 def search_web(query, api_key, max_results=5):
     """
@@ -107,6 +824,6 @@ def search_web(query, api_key, max_results=5):
         mock_results.append({
             "title": f"Result {i+1} for {query}",
             "snippet": f"This is a snippet of information related to {query}. It contains relevant details that would be useful for research.",
-            "url": f"https://example.com/result-{i+1}"
+            "url": f"https://example.com/result-{i+1}?q={quote_plus(query)}"
         })
-    return mock_results
\ No newline at end of file
+    return mock_results